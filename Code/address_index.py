@@ -0,0 +1,143 @@
+import difflib
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from assessor_io import read_addresses_sqft
+from cache_utils import file_digest
+
+path = os.getcwd()
+
+INDEX_PATH = os.path.join(path, "Data/Processed/address_index.parquet")
+
+# fuzzy matches must be at least this similar, and are only searched among this
+# many index entries sharing the house number and first letter of the street
+FUZZY_CUTOFF = 0.9
+MAX_FUZZY_CANDIDATES = 500
+
+DIRECTIONS = {"NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W"}
+STREET_TYPES = {"STREET": "ST", "AVENUE": "AVE", "AV": "AVE", "BOULEVARD": "BLVD",
+                "ROAD": "RD", "DRIVE": "DR", "PLACE": "PL", "COURT": "CT",
+                "PARKWAY": "PKWY", "TERRACE": "TER", "LANE": "LN", "HIGHWAY": "HWY",
+                "EXPRESSWAY": "EXPY", "SQUARE": "SQ", "CIRCLE": "CIR"}
+
+# unit designators and everything after them, e.g. "UNIT 2", "APT 3B", "# 4"
+UNIT_PATTERN = r"\s+(?:UNIT|APT|APARTMENT|STE|SUITE|FL|FLOOR|RM|ROOM|#)(?:\s+|$).*$"
+
+
+def normalize_addresses(addresses):
+    """Normalize street addresses so formatting differences don't block a match.
+
+    Upper-cases, drops punctuation and unit suffixes and abbreviates directions
+    and street types ("1234 West Madison Street Unit 2" -> "1234 W MADISON ST").
+    Each distinct address is only normalized once.
+    """
+    codes, uniques = pd.factorize(pd.Series(addresses, dtype="string[pyarrow]"))
+    clean = pd.Series(uniques, dtype="string[pyarrow]").str.upper()
+    clean = clean.str.replace(r"#", " # ", regex=True)
+    clean = clean.str.replace(r"[.,]", " ", regex=True)
+    clean = clean.str.replace(UNIT_PATTERN, "", regex=True)
+    for long, short in {**DIRECTIONS, **STREET_TYPES}.items():
+        clean = clean.str.replace(rf"\b{long}\b", short, regex=True)
+    clean = clean.str.replace(r"\s+", " ", regex=True).str.strip()
+    normalized = clean.to_numpy()[codes]
+    normalized[codes == -1] = None
+    return pd.Series(normalized, dtype="string[pyarrow]", index=getattr(addresses, "index", None))
+
+
+def block_keys(normalized):
+    """House number plus first letter of the street name, used to bound fuzzy search."""
+    parts = normalized.str.extract(r"^(\d+)\s+(?:[NSEW]\s+)?(\S)")
+    return parts[0] + " " + parts[1]
+
+
+def build_address_index(addresses_sqft):
+    """Lookup table from normalized address to PIN, square footage and fuzzy search block.
+
+    When several parcels share an address the first one is kept. Rows are sorted by
+    block (keeping file order within a block), so the fuzzy candidates of a block are
+    one contiguous run of rows.
+    """
+    index = pd.DataFrame({"address": normalize_addresses(addresses_sqft["Address"]).to_numpy(),
+                          "pin": addresses_sqft["pin"].to_numpy(),
+                          "SqFt": addresses_sqft["SqFt"].to_numpy()})
+    index = index.dropna(subset=["address"]).drop_duplicates(subset=["address"])
+    index["block"] = block_keys(index["address"])
+    index = index.sort_values("block", kind="stable", na_position="last")
+    return index.set_index("address")
+
+
+def block_runs(index):
+    """Map each block to the first and last-plus-one row of its fuzzy candidates."""
+    blocks = index["block"].dropna().to_numpy(dtype=object)
+    starts = np.flatnonzero(np.r_[True, blocks[1:] != blocks[:-1]])
+    stops = np.r_[starts[1:], len(blocks)]
+    return {key: (start, min(stop, start + MAX_FUZZY_CANDIDATES))
+            for key, start, stop in zip(blocks[starts], starts, stops)}
+
+
+def load_address_index(address_path, sqft_path, index_path=INDEX_PATH):
+    """Load the persisted address index, rebuilding it if the assessor files changed.
+
+    Returns the index table with its addresses and block runs ready for lookups.
+    """
+    digests = {"addresses": file_digest(address_path), "sqft": file_digest(sqft_path)}
+    index = None
+    if os.path.exists(index_path):
+        metadata = pq.read_schema(index_path).metadata or {}
+        if all(metadata.get(f"{k}_digest".encode()) == v.encode() for k, v in digests.items()):
+            index = pd.read_parquet(index_path)
+
+    if index is None:
+        index = build_address_index(read_addresses_sqft(address_path, sqft_path))
+        table = pa.Table.from_pandas(index)
+        table = table.replace_schema_metadata({**table.schema.metadata,
+                                               **{f"{k}_digest": v for k, v in digests.items()}})
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = index_path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, index_path)
+
+    return {"table": index,
+            "addresses": index.index.to_numpy(dtype=object),
+            "blocks": block_runs(index)}
+
+
+def lookup_addresses(index, addresses, fuzzy=True):
+    """Look up addresses in the index, returning pin, SqFt and how each one matched.
+
+    Exact matches are hash lookups on the normalized address. Addresses without an
+    exact match fall back to the closest address sharing their house number and
+    street initial, if it is at least FUZZY_CUTOFF similar. Each distinct unmatched
+    address is only searched once.
+    """
+    table = index["table"]
+    normalized = normalize_addresses(addresses)
+    positions = table.index.get_indexer(normalized)
+    match = pd.Series(pd.NA, index=normalized.index, dtype="string")
+    match[positions >= 0] = "exact"
+
+    missing = (positions == -1) & normalized.notna().to_numpy()
+    if fuzzy and missing.any():
+        codes, uniques = pd.factorize(normalized[missing])
+        found = np.full(len(uniques), -1)
+        for u, (address, key) in enumerate(zip(uniques, block_keys(pd.Series(uniques, dtype="string")))):
+            if pd.isna(key) or key not in index["blocks"]:
+                continue
+            start, stop = index["blocks"][key]
+            candidates = list(index["addresses"][start:stop])
+            close = difflib.get_close_matches(address, candidates, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                found[u] = start + candidates.index(close[0])
+        rows = missing.nonzero()[0]
+        positions[rows] = found[codes]
+        match.iloc[rows[found[codes] >= 0]] = "fuzzy"
+
+    found = positions >= 0
+    pins = pd.array(table["pin"].to_numpy().take(positions), dtype="Int64")
+    sqft = table["SqFt"].to_numpy().take(positions).astype("float64")
+    pins[~found] = pd.NA
+    sqft[~found] = np.nan
+    return pd.DataFrame({"pin": pins, "SqFt": sqft, "match": match}, index=normalized.index)
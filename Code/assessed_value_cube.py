@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyogrio import read_dataframe
+
+from cache_utils import file_digest
+
+path = os.getcwd()
+
+# only the attribute table of the assessor history is read, never its geometry
+SOURCE_PATH = os.path.join(path, "Data/merged_gdf_shapefile/merged_gdf_shapefile.dbf")
+CUBE_PATH = os.path.join(path, "Data/Processed/assessed_value_cube.parquet")
+
+
+def build_value_cube(source_path=SOURCE_PATH):
+    """Mean certified assessed value per neighborhood (rows) and year (columns).
+
+    Values that aren't numbers count as 0, as they did when the means were taken
+    from the full shapefile. A neighborhood missing from a year's data is NaN.
+    """
+    df = read_dataframe(source_path, read_geometry=False, columns=["pri_neigh", "year", "certifie_1"])
+    df["value"] = pd.to_numeric(df["certifie_1"], errors="coerce").fillna(0)
+    cube = df.pivot_table(index="pri_neigh", columns="year", values="value", aggfunc="mean")
+    cube.columns = cube.columns.astype(int)
+    return cube.rename_axis(index="pri_neigh", columns="year")
+
+
+def load_value_cube(source_path=SOURCE_PATH, cube_path=CUBE_PATH):
+    """Load the persisted value cube, rebuilding it if the assessor history changed."""
+    digest = file_digest(source_path)
+    if os.path.exists(cube_path):
+        metadata = pq.read_schema(cube_path).metadata or {}
+        if metadata.get(b"source_digest") == digest.encode():
+            cube = pd.read_parquet(cube_path).set_index("pri_neigh")
+            cube.columns = cube.columns.astype(int)
+            return cube.rename_axis(columns="year")
+
+    cube = build_value_cube(source_path)
+    table = pa.Table.from_pandas(cube.set_axis(cube.columns.astype(str), axis=1).reset_index(), preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, "source_digest": digest})
+    os.makedirs(os.path.dirname(cube_path), exist_ok=True)
+    tmp_path = cube_path + ".tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, cube_path)
+    return cube
+
+
+def year_range(cube, first, last):
+    """Every year of the cube from `first` to `last`, both included."""
+    return cube.loc[:, (cube.columns >= first) & (cube.columns <= last)]
+
+
+def value_change(cube, start, end):
+    """Change in mean assessed value between pairs of years, for every neighborhood.
+
+    `start` and `end` are years or equal-length lists of years; all pairs are taken
+    from the cube at once. Returns one row per pair and neighborhood with data in
+    both years: start, end, pri_neigh, value_start, value_end, difference (absolute)
+    and percent_change (difference as a percent of the start value).
+    """
+    start, end = np.atleast_1d(start), np.atleast_1d(end)
+    start_idx, end_idx = cube.columns.get_indexer(start), cube.columns.get_indexer(end)
+    if (start_idx < 0).any() or (end_idx < 0).any():
+        raise KeyError(f"years not in the assessed value cube, it has {list(cube.columns)}")
+    values = cube.to_numpy()
+    before, after = values[:, start_idx], values[:, end_idx]
+    difference = np.abs(after - before)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = difference / np.abs(before) * 100
+
+    # neighborhoods x pairs, flattened pair by pair
+    change = pd.DataFrame({"start": np.repeat(start, len(cube)),
+                           "end": np.repeat(end, len(cube)),
+                           "pri_neigh": np.tile(cube.index.to_numpy(), len(start)),
+                           "value_start": before.T.ravel(),
+                           "value_end": after.T.ravel(),
+                           "difference": difference.T.ravel(),
+                           "percent_change": percent.T.ravel()})
+    return change.dropna(subset=["value_start", "value_end"]).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    cube = load_value_cube()
+    print(f"{cube.shape[0]} neighborhoods x years {list(cube.columns)} written to "
+          f"{os.path.relpath(CUBE_PATH, path)}")
@@ -0,0 +1,54 @@
+import pandas as pd
+
+# rows read per chunk, peak memory is a few chunks plus the per-PIN totals
+CHUNK_SIZE = 250_000
+
+# number of partial per-PIN totals kept before they are combined
+MAX_PARTIALS = 8
+
+
+def read_building_sqft(csv_path, chunksize=CHUNK_SIZE):
+    """Total building square footage per PIN from the improvement characteristics CSV.
+
+    Only the pin and building_sqft columns are read, in chunks, and each chunk is
+    summed by PIN as soon as it is read. Some PINs have several improvements (e.g.
+    two homes on one property) so their square footage is added up.
+    """
+    partials = []
+    chunks = pd.read_csv(csv_path, usecols=["pin", "building_sqft"],
+                         dtype={"pin": "Int64", "building_sqft": "float32"},
+                         chunksize=chunksize)
+    for chunk in chunks:
+        # a blank PIN can't be joined to an address, drop it instead of failing the read
+        chunk = chunk.dropna(subset=["pin"]).astype({"pin": "int64"})
+        partials.append(chunk.groupby("pin")["building_sqft"].sum())
+        if len(partials) >= MAX_PARTIALS:
+            partials = [pd.concat(partials).groupby(level=0).sum()]
+    if not partials:
+        return pd.Series(dtype="float32", name="building_sqft", index=pd.Index([], dtype="int64", name="pin"))
+    return pd.concat(partials).groupby(level=0).sum()
+
+
+def read_addresses_sqft(address_path, sqft_path, chunksize=CHUNK_SIZE):
+    """Parcel addresses joined to total building square footage (pin, Address, SqFt).
+
+    The parcel address CSV is streamed in chunks and each chunk is joined to the
+    per-PIN square footage right away, so parcels without improvement data are
+    never held in memory.
+    """
+    sqft = read_building_sqft(sqft_path, chunksize)
+    matched = []
+    chunks = pd.read_csv(address_path, usecols=["pin", "property_address"],
+                         dtype={"pin": "Int64", "property_address": "string[pyarrow]"},
+                         chunksize=chunksize)
+    for chunk in chunks:
+        chunk = chunk.dropna(subset=["pin"]).astype({"pin": "int64"})
+        chunk = chunk.loc[chunk["pin"].isin(sqft.index)]
+        matched.append(chunk.assign(SqFt=sqft.reindex(chunk["pin"]).to_numpy()))
+    if not matched:
+        return pd.DataFrame({"pin": pd.Series(dtype="int64"),
+                             "Address": pd.Series(dtype="string[pyarrow]"),
+                             "SqFt": pd.Series(dtype="float32")})
+    addresses_sqft = pd.concat(matched, ignore_index=True)
+    addresses_sqft = addresses_sqft.rename(columns={"property_address": "Address"})
+    return addresses_sqft[["pin", "Address", "SqFt"]]
@@ -0,0 +1,110 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import contextily as ctx
+import mercantile
+import numpy as np
+import requests
+from PIL import Image
+from pyproj import Transformer
+
+path = os.getcwd()
+
+# CartoDB Positron tiles stored as Data/Basemap/{z}/{x}/{y}.png
+BASEMAP_DIR = os.path.join(path, "Data/Basemap")
+PROVIDER = ctx.providers.CartoDB.Positron
+
+# Chicago with room for the margins of a square figure around it, in lon/lat
+CHICAGO_BOUNDS = (-88.06, 41.58, -87.40, 42.11)
+
+# the citywide maps use the automatic zoom (11 for Chicago), the neighborhood maps 15
+BASEMAP_ZOOMS = list(range(10, 16))
+
+TILE_SIZE = 256
+
+to_lonlat = Transformer.from_crs(3857, 4326, always_xy=True)
+
+
+def tile_path(tile, folder=BASEMAP_DIR):
+    return os.path.join(folder, str(tile.z), str(tile.x), f"{tile.y}.png")
+
+
+def fetch_tile(tile, folder=BASEMAP_DIR):
+    """Download one tile unless it is already stored, moving it into place when complete."""
+    out_path = tile_path(tile, folder)
+    if os.path.exists(out_path):
+        return False
+    response = requests.get(PROVIDER.build_url(x=tile.x, y=tile.y, z=tile.z),
+                            headers={"User-Agent": "KIHC-affordable-housing-analysis"}, timeout=30)
+    response.raise_for_status()
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(response.content)
+    os.replace(tmp_path, out_path)
+    return True
+
+
+def seed(bounds=CHICAGO_BOUNDS, zooms=BASEMAP_ZOOMS, folder=BASEMAP_DIR, workers=8):
+    """Download every tile covering `bounds` at `zooms`, skipping stored tiles."""
+    tiles = list(mercantile.tiles(*bounds, zooms))
+    with ThreadPoolExecutor(workers) as pool:
+        fetched = sum(pool.map(lambda tile: fetch_tile(tile, folder), tiles))
+    return len(tiles), fetched
+
+
+def clip_to_store(xmin, ymin, xmax, ymax, bounds=CHICAGO_BOUNDS):
+    """Web mercator bounds limited to the extent the tile store is seeded for."""
+    left, bottom = mercantile.xy(bounds[0], bounds[1])
+    right, top = mercantile.xy(bounds[2], bounds[3])
+    return max(xmin, left), max(ymin, bottom), min(xmax, right), min(ymax, top)
+
+
+def auto_zoom(w, s, e, n):
+    """The zoom contextily picks for a lon/lat extent, limited to the stored zooms."""
+    zoom = int(min(np.ceil(np.log2(720 / (e - w))), np.ceil(np.log2(720 / (n - s)))))
+    return min(max(zoom, min(BASEMAP_ZOOMS)), max(BASEMAP_ZOOMS))
+
+
+def add_offline_basemap(ax, zoom="auto", alpha=1.0, folder=BASEMAP_DIR):
+    """Draw the stored Positron tiles under a plot in EPSG:3857, like ctx.add_basemap.
+
+    Only tiles in the local store are read; run `python Code/basemap_cache.py` once
+    (with network) to seed it.
+    """
+    xmin, xmax, ymin, ymax = ax.axis()
+    w, s = to_lonlat.transform(xmin, ymin)
+    e, n = to_lonlat.transform(xmax, ymax)
+    if zoom == "auto":
+        zoom = auto_zoom(w, s, e, n)
+
+    tiles = list(mercantile.tiles(w, s, e, n, zoom))
+    missing = [tile_path(tile, folder) for tile in tiles if not os.path.exists(tile_path(tile, folder))]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} basemap tiles at zoom {zoom} are not stored "
+                                f"(e.g. {missing[0]}), run python Code/basemap_cache.py")
+
+    # paste the tiles into one image spanning their bounds
+    xs = [tile.x for tile in tiles]
+    ys = [tile.y for tile in tiles]
+    image = Image.new("RGBA", ((max(xs) - min(xs) + 1) * TILE_SIZE, (max(ys) - min(ys) + 1) * TILE_SIZE))
+    for tile in tiles:
+        with Image.open(tile_path(tile, folder)) as tile_image:
+            image.paste(tile_image.convert("RGBA"),
+                        ((tile.x - min(xs)) * TILE_SIZE, (tile.y - min(ys)) * TILE_SIZE))
+    top_left = mercantile.xy_bounds(min(xs), min(ys), zoom)
+    bottom_right = mercantile.xy_bounds(max(xs), max(ys), zoom)
+
+    ax.imshow(np.asarray(image), extent=(top_left.left, bottom_right.right, bottom_right.bottom, top_left.top),
+              interpolation="bilinear", alpha=alpha)
+    ax.axis((xmin, xmax, ymin, ymax))
+    ctx.add_attribution(ax, PROVIDER["attribution"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the basemap tiles the map scripts use.")
+    parser.add_argument("--zooms", type=int, nargs="+", default=BASEMAP_ZOOMS)
+    args = parser.parse_args()
+    total, fetched = seed(zooms=args.zooms)
+    print(f"{fetched:,} tiles downloaded, {total:,} stored in {BASEMAP_DIR}")
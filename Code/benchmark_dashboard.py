@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import contextlib
+import html
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import psutil
+from websockets.asyncio.client import connect
+
+path = os.getcwd()
+
+BENCHMARK_DIR = os.path.join(path, "Data/Benchmarks")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "dashboard_baseline.json")
+
+# map outputs of dashboard/app.py, all reported visible so the server renders them
+OUTPUTS = ["full_map_plot", "tif_district_plot", "chicago_plot", "neighborhood_plot"]
+
+LAYERS = ["TIF Districts", "Metra and CTA 'L' Lines", "ETOD Eligible Bus Corridors",
+          "ETOD Eligible City-Owned Land"]
+BUILDINGS = ["Vacant Buildings", "Buildings for Sale"]
+ZONES = ["B-Business", "C-Commercial", "D-Downtown", "PD-Planned Development", "R-Residential"]
+
+# a run regresses when a p95 latency or a payload grows by more than this share
+TOLERANCE = 0.2
+
+
+class Session:
+    """One scripted browser session talking the Shiny websocket protocol.
+
+    Every step changes inputs and waits until the server is idle and has sent the
+    new outputs, recording how long each output (or in-place map update) took to
+    arrive after the change and how many bytes it was.
+    """
+
+    def __init__(self, ws, timings, errors):
+        self.ws = ws
+        self.timings = timings
+        self.errors = errors
+        self.select_choices = {}
+
+    async def send(self, method, data):
+        await self.ws.send(json.dumps({"method": method, "data": data}))
+
+    async def step(self, method, data, timeout=120):
+        start = time.perf_counter()
+        await self.send(method, data)
+        idle = False
+        while True:
+            message = json.loads(await asyncio.wait_for(self.ws.recv(), timeout))
+            elapsed = time.perf_counter() - start
+            for output, value in (message.get("values") or {}).items():
+                self.record(output, elapsed, value)
+            for output, error in (message.get("errors") or {}).items():
+                self.errors.append(f"{output}: {error.get('message')}")
+            # layer and zone changes are sent to maps already in the browser
+            update = (message.get("custom") or {}).get("kihc_map_update")
+            if update:
+                self.record(f"{update['output']} (update)", elapsed, update)
+            for input_message in message.get("inputMessages") or []:
+                options = input_message.get("message", {}).get("options")
+                if options:
+                    self.select_choices[input_message["id"]] = [
+                        html.unescape(v) for v in re.findall(r'value="([^"]*)"', options)]
+            # outputs are flushed right after the server goes idle
+            if message.get("busy") == "idle":
+                idle = True
+            elif idle and "values" in message:
+                return
+
+    def record(self, output, elapsed, value):
+        self.timings.setdefault(output, []).append((elapsed, len(json.dumps(value))))
+
+
+async def run_session(url, rounds, think, seed, timings, errors):
+    rng = random.Random(seed)
+    ws_url = url.replace("http", "ws", 1).rstrip("/") + "/websocket/"
+    async with connect(ws_url, max_size=None) as ws:
+        session = Session(ws, timings, errors)
+        init = {"layers": LAYERS, "zones": ZONES, "buildings": BUILDINGS, "zones_2": ZONES,
+                "tif": "", "neighborhood": ""}
+        init.update({f".clientdata_output_{output}_hidden": False for output in OUTPUTS})
+        await session.step("init", init)
+        tifs = session.select_choices.get("tif", [])
+        neighborhoods = session.select_choices.get("neighborhood", [])
+        # the browser selects the first choice once the dropdowns are filled
+        await session.step("update", {"tif": tifs[0] if tifs else "",
+                                      "neighborhood": neighborhoods[0] if neighborhoods else ""})
+
+        for _ in range(rounds):
+            steps = [{"layers": rng.sample(LAYERS, rng.randint(1, len(LAYERS)))},
+                     {"zones": rng.sample(ZONES, rng.randint(1, len(ZONES)))},
+                     {"buildings": rng.sample(BUILDINGS, rng.randint(1, len(BUILDINGS)))}]
+            if tifs:
+                steps.append({"tif": rng.choice(tifs)})
+            if neighborhoods:
+                steps.append({"neighborhood": rng.choice(neighborhoods)})
+            for data in steps:
+                await session.step("update", data)
+                await asyncio.sleep(think)
+
+
+async def run_load(url, sessions, rounds, think, seed):
+    timings, errors = {}, []
+    # open the page once like a browser would, the websocket sessions reuse it
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        page = response.read()
+    timings["page"] = [(time.perf_counter() - start, len(page))]
+
+    results = await asyncio.gather(*[run_session(url, rounds, think, seed + i, timings, errors)
+                                     for i in range(sessions)], return_exceptions=True)
+    errors += [f"session failed: {r!r}" for r in results if isinstance(r, Exception)]
+    return timings, errors
+
+
+class ResourceSampler:
+    """Samples CPU and memory of the server process (and its children) in a thread."""
+
+    def __init__(self, pid, interval=0.5):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu, self.rss = [], []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def processes(self):
+        return [self.process] + self.process.children(recursive=True)
+
+    def run(self):
+        for p in self.processes():
+            p.cpu_percent(None)
+        while not self.stop_event.wait(self.interval):
+            try:
+                procs = self.processes()
+                self.cpu.append(sum(p.cpu_percent(None) for p in procs))
+                self.rss.append(sum(p.memory_info().rss for p in procs))
+            except psutil.NoSuchProcess:
+                break
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+
+    def summary(self):
+        return {"cpu_mean_pct": float(np.mean(self.cpu)) if self.cpu else None,
+                "cpu_max_pct": float(np.max(self.cpu)) if self.cpu else None,
+                "rss_max_mb": float(np.max(self.rss)) / 1e6 if self.rss else None}
+
+
+def summarize(timings):
+    """Latency percentiles (ms) and payload size (bytes) per output."""
+    summary = {}
+    for output, samples in sorted(timings.items()):
+        latency = np.array([s[0] for s in samples]) * 1000
+        size = np.array([s[1] for s in samples])
+        summary[output] = {"count": len(samples),
+                           "p50_ms": float(np.percentile(latency, 50)),
+                           "p95_ms": float(np.percentile(latency, 95)),
+                           "p99_ms": float(np.percentile(latency, 99)),
+                           "mean_bytes": float(size.mean())}
+    return summary
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Outputs whose p95 latency or payload grew by more than `tolerance`."""
+    regressions = []
+    for output, stats in results["outputs"].items():
+        base = baseline["outputs"].get(output)
+        if base is None:
+            continue
+        for metric in ("p95_ms", "mean_bytes"):
+            if base[metric] and stats[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{output} {metric}: {base[metric]:,.0f} -> {stats[metric]:,.0f}")
+    base_rss, rss = baseline["server"].get("rss_max_mb"), results["server"].get("rss_max_mb")
+    if base_rss and rss and rss > base_rss * (1 + tolerance):
+        regressions.append(f"server rss_max_mb: {base_rss:,.0f} -> {rss:,.0f}")
+    return regressions
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    """Run dashboard/app.py under uvicorn and wait until it answers."""
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=os.path.join(path, "dashboard"))
+    url = f"http://127.0.0.1:{port}/"
+    for _ in range(240):
+        if server.poll() is not None:
+            raise RuntimeError("dashboard server exited during startup")
+        try:
+            urllib.request.urlopen(url).close()
+            return server, url
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("dashboard server did not start within 2 minutes")
+
+
+def print_report(results, regressions):
+    print(f"{'output':<36}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'KB':>10}")
+    for output, stats in results["outputs"].items():
+        print(f"{output:<36}{stats['count']:>7}{stats['p50_ms']:>10.0f}{stats['p95_ms']:>10.0f}"
+              f"{stats['p99_ms']:>10.0f}{stats['mean_bytes'] / 1e3:>10.1f}")
+    server = results["server"]
+    if server.get("cpu_mean_pct") is not None:
+        print(f"server cpu mean {server['cpu_mean_pct']:.0f}% max {server['cpu_max_pct']:.0f}%, "
+              f"rss max {server['rss_max_mb']:.0f} MB")
+    for error in results["errors"][:10]:
+        print("ERROR", error)
+    if len(results["errors"]) > 10:
+        print(f"... {len(results['errors']) - 10} more errors")
+    for regression in regressions:
+        print("REGRESSION", regression)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the dashboard with scripted sessions.")
+    parser.add_argument("--url", help="benchmark a running dashboard instead of starting one")
+    parser.add_argument("--pid", type=int, help="server process to sample CPU and memory of, with --url")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent sessions")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds of input changes per session")
+    parser.add_argument("--think", type=float, default=0.5, help="seconds between a session's actions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="where to write the results (default: Data/Benchmarks/dashboard_<time>.json)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="save this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url, pid = args.url, args.pid
+    else:
+        server, url = start_server(free_port())
+        pid = server.pid
+    sampler = ResourceSampler(pid) if pid else None
+    try:
+        start = time.time()
+        with sampler or contextlib.nullcontext():
+            timings, errors = asyncio.run(run_load(url, args.sessions, args.rounds, args.think, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = {"date": time.strftime("%Y-%m-%d %H:%M:%S"),
+               "settings": {"sessions": args.sessions, "rounds": args.rounds, "think": args.think,
+                            "seed": args.seed},
+               "duration_s": time.time() - start,
+               "outputs": summarize(timings),
+               "server": sampler.summary() if sampler else {},
+               "errors": errors}
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    results["regressions"] = regressions
+    print_report(results, regressions)
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    output = args.output or os.path.join(BENCHMARK_DIR, time.strftime("dashboard_%Y%m%d_%H%M%S.json"))
+    for out_path in [output] + ([args.baseline] if args.save_baseline else []):
+        with open(out_path, "w") as f:
+            json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+    sys.exit(1 if regressions or errors else 0)
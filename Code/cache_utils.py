@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+path = os.getcwd()
+
+CACHE_DIR = os.path.join(path, "Data/Cache")
+
+# a shapefile is several files on disk, all of them make up its content
+SHAPEFILE_PARTS = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+
+
+def file_digest(file_path, block_size=1 << 20):
+    """Return the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_files(file_path):
+    """Return every file on disk that belongs to a dataset path."""
+    stem, ext = os.path.splitext(file_path)
+    if ext.lower() == ".shp":
+        return [stem + part for part in SHAPEFILE_PARTS if os.path.exists(stem + part)]
+    return [file_path]
+
+
+def dataset_digest(file_path, known=None):
+    """Return a digest covering all files of a dataset.
+
+    `known` maps file paths to a previous {"size", "mtime_ns", "digest"} record so
+    that large files that have not been touched since the last run are not re-read.
+    The dict is updated in place with fresh records.
+    """
+    known = {} if known is None else known
+    digest = hashlib.sha256()
+    for part in dataset_files(file_path):
+        stat = os.stat(part)
+        record = known.get(part)
+        if record is None or record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+            record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": file_digest(part)}
+            known[part] = record
+        digest.update(os.path.basename(part).encode())
+        digest.update(record["digest"].encode())
+    return digest.hexdigest()
+
+
+def load_json(file_path, default=None):
+    if not os.path.exists(file_path):
+        return {} if default is None else default
+    with open(file_path) as f:
+        return json.load(f)
+
+
+def save_json(obj, file_path):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, file_path)
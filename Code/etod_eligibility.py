@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import shapely
+
+# NAD83 / Illinois East in meters, distances in Web Mercator are ~34% too long at
+# Chicago's latitude
+METRIC_CRS = "EPSG:26971"
+
+# ETOD eligibility: half a mile from an 'L' or Metra stop, a quarter mile from an
+# eligible bus corridor
+STOP_DISTANCE = 804.67
+CORRIDOR_DISTANCE = 402.335
+
+# ETOD eligible bus corridors
+ETOD_CORRIDORS = ["55", "63", "79", "9", "X9", "66", "134", "135",
+                  "136", "43", "146", "147", "148", "2", "6", "J14", "26", "28",
+                  "49", "X49"]
+
+
+def line_segments(lines):
+    """Split (multi)linestrings into two-point segments, returning the segments and
+    the position of the line each one came from.
+
+    Long bus routes have bounding boxes covering much of the city, which makes a tree
+    over whole routes slow to search. A tree over short segments stays tight.
+    """
+    parts, part_owner = shapely.get_parts(lines, return_index=True)
+    coords, part_idx = shapely.get_coordinates(parts, return_index=True)
+    same_part = part_idx[:-1] == part_idx[1:]
+    segments = shapely.linestrings(np.stack([coords[:-1][same_part], coords[1:][same_part]], axis=1))
+    return segments, part_owner[part_idx[:-1][same_part]]
+
+
+def nearest(sites, targets, labels):
+    """Label of and distance (in meters) to the nearest target for every site.
+
+    `sites` and `targets` are geometry arrays already in METRIC_CRS. Uses one
+    indexed nearest-neighbour query instead of buffering every target.
+    """
+    labels = np.asarray(labels, dtype=object)
+    # LineString or MultiLineString
+    if np.isin(shapely.get_type_id(targets), [1, 5]).all():
+        targets, owner = line_segments(targets)
+        labels = labels[owner]
+    site_idx, target_idx = shapely.STRtree(targets).query_nearest(sites, all_matches=False)
+    distance = np.full(len(sites), np.inf)
+    label = np.full(len(sites), None, dtype=object)
+    distance[site_idx] = shapely.distance(sites[site_idx], targets[target_idx])
+    label[site_idx] = labels[target_idx]
+    return label, distance
+
+
+def etod_eligibility(sites_gdf, stops_gdf, corridors_gdf, stop_label, corridor_label,
+                     stop_distance=STOP_DISTANCE, corridor_distance=CORRIDOR_DISTANCE):
+    """Whether each site is ETOD eligible, with its nearest stop and bus corridor.
+
+    Every layer is projected once into METRIC_CRS. Returns a frame aligned with
+    `sites_gdf` with columns nearest_stop, stop_dist_m, nearest_corridor,
+    corridor_dist_m and etod_eligible (within `stop_distance` meters of a stop or
+    `corridor_distance` meters of a corridor).
+    """
+    sites = sites_gdf.geometry.to_crs(METRIC_CRS).to_numpy()
+    stops = stops_gdf.geometry.to_crs(METRIC_CRS).to_numpy()
+    corridors = corridors_gdf.geometry.to_crs(METRIC_CRS).to_numpy()
+
+    stop, stop_dist = nearest(sites, stops, stops_gdf[stop_label])
+    corridor, corridor_dist = nearest(sites, corridors, corridors_gdf[corridor_label])
+    return pd.DataFrame({"nearest_stop": stop,
+                         "stop_dist_m": stop_dist.round(1),
+                         "nearest_corridor": corridor,
+                         "corridor_dist_m": corridor_dist.round(1),
+                         "etod_eligible": (stop_dist <= stop_distance) | (corridor_dist <= corridor_distance)},
+                        index=sites_gdf.index)
+
+
+def route_distances(sites_gdf, routes_gdf, route_label, max_distance):
+    """Distance (in meters) from each site to every route within `max_distance`.
+
+    Returns a long frame with columns site (position in `sites_gdf`), route and
+    dist_m, one row per site and route pair, so eligibility can be re-evaluated
+    for any subset of routes and any distance up to `max_distance` without
+    another spatial query.
+    """
+    sites = sites_gdf.geometry.to_crs(METRIC_CRS).to_numpy()
+    routes = routes_gdf.geometry.to_crs(METRIC_CRS).to_numpy()
+    segments, owner = line_segments(routes)
+    site_idx, segment_idx = shapely.STRtree(segments).query(sites, predicate="dwithin",
+                                                           distance=max_distance)
+    pairs = pd.DataFrame({"site": site_idx,
+                          "route": np.asarray(routes_gdf[route_label], dtype=object)[owner[segment_idx]],
+                          "dist_m": shapely.distance(sites[site_idx], segments[segment_idx])})
+    return pairs.groupby(["site", "route"], as_index=False)["dist_m"].min()
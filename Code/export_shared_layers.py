@@ -0,0 +1,70 @@
+import json
+import os
+
+import pyarrow as pa
+import shapely
+
+from layer_io import DASHBOARD_LAYERS, PROCESSED_DIR, read_layer
+
+path = os.getcwd()
+
+# Arrow IPC copies of the dashboard layers that every dashboard worker memory maps
+SHARED_DIR = os.path.join(PROCESSED_DIR, "shared")
+
+# point layers also get their EPSG:4326 coordinates as plain float columns, so the
+# citywide maps read them straight from the mapped file
+COORDINATE_COLUMNS = ["lon", "lat"]
+
+
+def shared_path(name, folder=SHARED_DIR):
+    return os.path.join(folder, name + ".arrow")
+
+
+def write_shared_layer(gdf, name, folder=SHARED_DIR):
+    """Write a layer as an uncompressed Arrow IPC file that can be memory mapped.
+
+    Geometries are stored as WKB in a geoarrow.wkb column and text columns are
+    dictionary encoded, so a worker mapping the file only decodes the rows it uses.
+    Point layers also get lon and lat columns. The file is written next to its final
+    path and moved into place.
+    """
+    os.makedirs(folder, exist_ok=True)
+    geometry_column = gdf.geometry.name
+    arrays, fields = [], []
+    for col in gdf.columns:
+        if col == geometry_column:
+            continue
+        array = pa.array(gdf[col], from_pandas=True)
+        if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+            array = array.dictionary_encode()
+        arrays.append(array)
+        fields.append(pa.field(col, array.type))
+
+    metadata = {"geometry_column": geometry_column, "crs": gdf.crs.to_wkt() if gdf.crs is not None else ""}
+    if len(gdf) and (gdf.geom_type == "Point").all():
+        points = gdf.geometry.to_crs(epsg=4326).to_numpy() if gdf.crs is not None else gdf.geometry.to_numpy()
+        for col, values in zip(COORDINATE_COLUMNS, (shapely.get_x(points), shapely.get_y(points))):
+            arrays.append(pa.array(values, type=pa.float64()))
+            fields.append(pa.field(col, pa.float64()))
+        metadata["coordinate_columns"] = ",".join(COORDINATE_COLUMNS)
+
+    crs = gdf.crs.to_json_dict() if gdf.crs is not None else None
+    arrays.append(pa.array(shapely.to_wkb(gdf.geometry.to_numpy()), type=pa.binary()))
+    fields.append(pa.field(geometry_column, pa.binary(),
+                           metadata={"ARROW:extension:name": "geoarrow.wkb",
+                                     "ARROW:extension:metadata": json.dumps({"crs": crs})}))
+    schema = pa.schema(fields, metadata=metadata)
+    table = pa.Table.from_arrays(arrays, schema=schema)
+
+    out_path = shared_path(name, folder)
+    tmp_path = out_path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+if __name__ == "__main__":
+    for name in DASHBOARD_LAYERS:
+        out_path = write_shared_layer(read_layer(name), name)
+        print(f"{name}: {os.path.getsize(out_path) / 1e6:.1f} MB")
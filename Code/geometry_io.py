@@ -0,0 +1,42 @@
+import glob
+import os
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+from cache_utils import CACHE_DIR, file_digest
+
+GEOMETRY_CACHE_DIR = os.path.join(CACHE_DIR, "geometry")
+
+
+def read_wkt_csv(csv_path, wkt_column="the_geom", geometry_name="geometry", crs="EPSG:4326"):
+    """Read a Data Portal CSV export with a WKT geometry column as a GeoDataFrame.
+
+    All WKT strings are parsed in one vectorized shapely call. The parsed frame is
+    cached as GeoParquet (WKB geometry) keyed on the CSV's content hash, so later
+    runs read the cache and skip parsing entirely. The WKT column is dropped and
+    the geometry is stored in `geometry_name`.
+    """
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    digest = file_digest(csv_path)
+    cache_path = os.path.join(GEOMETRY_CACHE_DIR, f"{stem}-{digest[:16]}.parquet")
+
+    if os.path.exists(cache_path):
+        gdf = gpd.read_parquet(cache_path)
+    else:
+        df = pd.read_csv(csv_path)
+        geometry = shapely.from_wkt(df.pop(wkt_column).to_numpy())
+        gdf = gpd.GeoDataFrame(df, geometry=geometry, crs=crs)
+
+        # drop caches of older versions of the same file before writing the new one
+        os.makedirs(GEOMETRY_CACHE_DIR, exist_ok=True)
+        for old_path in glob.glob(os.path.join(GEOMETRY_CACHE_DIR, f"{stem}-*.parquet")):
+            if old_path != cache_path:
+                os.remove(old_path)
+        tmp_path = cache_path + f".{os.getpid()}.tmp"
+        gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    if geometry_name != gdf.geometry.name:
+        gdf = gdf.rename_geometry(geometry_name)
+    return gdf
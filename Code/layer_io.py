@@ -0,0 +1,126 @@
+import json
+import os
+import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
+
+path = os.getcwd()
+
+PROCESSED_DIR = os.path.join(path, "Data/Processed")
+DASHBOARD_DIR = os.path.join(path, "dashboard/Data/Processed")
+
+# "parquet" writes a single GeoParquet copy of each layer to Data/Processed that the
+# dashboard reads directly. "shapefile" keeps the old shapefiles, written to both
+# Data/Processed and dashboard/Data/Processed
+OUTPUT_FORMAT = os.environ.get("KIHC_OUTPUT_FORMAT", "parquet")
+
+# layers the dashboard reads, only these get a dashboard copy in shapefile mode
+DASHBOARD_LAYERS = ["etod_lots_tifs", "vacant_buildings", "sale_buildings",
+                    "neighborhood_level", "tif_districts", "rail_lines", "bus_routes"]
+
+# polygon layers also written simplified for each map zoom by Code/simplify_layers.py,
+# as <layer>_z<zoom>
+SIMPLIFIED_LAYERS = ["tif_districts", "neighborhood_level"]
+SIMPLIFY_ZOOMS = [10, 11, 12, 13, 14]
+
+
+def simplified_name(name, zoom):
+    return f"{name}_z{zoom}"
+
+
+# everything the dashboard reads
+DASHBOARD_COPIES = DASHBOARD_LAYERS + [simplified_name(name, zoom)
+                                       for name in SIMPLIFIED_LAYERS for zoom in SIMPLIFY_ZOOMS]
+
+# shapefiles cut column names to 10 characters, map them back when reading old files.
+# dashboard/layers.py keeps an identical copy, update both
+SHAPEFILE_COLUMNS = {"station_na": "station_name",
+                     "percent_ch": "percent_change",
+                     "Property N": "Property Name",
+                     "Property S": "Property Status",
+                     "Community ": "Community Area Name",
+                     "Asking Pri": "Asking Price",
+                     "index_righ": "index_right",
+                     "re_zone_ca": "re_zone_cat",
+                     "lot_area_p": "lot_area_per_unit",
+                     "sq_ft_rent": "sq_ft_rentable",
+                     "sq_ft_resi": "sq_ft_residential",
+                     "avg_unit_s": "avg_unit_size",
+                     "imputed_n_": "imputed_n_units"}
+
+
+def layer_path(name, fmt=None, folder=PROCESSED_DIR):
+    ext = ".parquet" if (fmt or OUTPUT_FORMAT) == "parquet" else ".shp"
+    return os.path.join(folder, name + ext)
+
+
+def layer_outputs(names, fmt=None):
+    """Paths (relative to the repo root) written by write_layer for each layer name."""
+    fmt = fmt or OUTPUT_FORMAT
+    outputs = [os.path.relpath(layer_path(name, fmt), path) for name in names]
+    if fmt != "parquet":
+        outputs += [os.path.relpath(layer_path(name, fmt, DASHBOARD_DIR), path)
+                    for name in names if name in DASHBOARD_COPIES]
+    return outputs
+
+
+def write_layer(gdf, name, fmt=None):
+    """Write a processed layer in the configured output format."""
+    fmt = fmt or OUTPUT_FORMAT
+    gdf = gdf.copy()
+    # columns mixing numbers and text (e.g. n_units = "unknown") are stored as text,
+    # which is what the shapefile driver did implicitly
+    for col in gdf.columns:
+        if col != gdf.geometry.name and gdf[col].dtype == object:
+            if pd.api.types.infer_dtype(gdf[col], skipna=True).startswith("mixed"):
+                gdf[col] = gdf[col].where(gdf[col].isna(), gdf[col].astype(str))
+
+    if fmt == "parquet":
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        gdf.to_parquet(layer_path(name, fmt), index=False, write_covering_bbox=True)
+    else:
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        gdf.to_file(layer_path(name, fmt))
+        if name in DASHBOARD_COPIES:
+            os.makedirs(DASHBOARD_DIR, exist_ok=True)
+            gdf.to_file(layer_path(name, fmt, DASHBOARD_DIR))
+
+
+def apply_filters(df, filters):
+    """Apply pyarrow style filters ([(column, op, value), ...]) to a data frame."""
+    ops = {"==": lambda s, v: s == v,
+           "=": lambda s, v: s == v,
+           "!=": lambda s, v: s != v,
+           "<": lambda s, v: s < v,
+           "<=": lambda s, v: s <= v,
+           ">": lambda s, v: s > v,
+           ">=": lambda s, v: s >= v,
+           "in": lambda s, v: s.isin(v),
+           "not in": lambda s, v: ~s.isin(v)}
+    for col, op, value in filters:
+        df = df[ops[op](df[col], value)]
+    return df
+
+
+def read_layer(name, columns=None, filters=None, bbox=None, folder=PROCESSED_DIR):
+    """Read a processed layer, loading only the requested columns and rows.
+
+    `columns` should not include the geometry column, it is always read. `filters`
+    are pushed down to the parquet reader so row groups that can't match are skipped,
+    `bbox` (minx, miny, maxx, maxy) does the same for the geometry. Falls back to the
+    shapefile version of the layer if no GeoParquet file has been written yet.
+    """
+    parquet_path = layer_path(name, "parquet", folder)
+    if os.path.exists(parquet_path):
+        if columns is not None:
+            geo = json.loads(pq.read_schema(parquet_path).metadata[b"geo"])
+            columns = list(columns) + [geo["primary_column"]]
+        return gpd.read_parquet(parquet_path, columns=columns, filters=filters, bbox=bbox)
+
+    gdf = gpd.read_file(layer_path(name, "shapefile", folder), bbox=bbox)
+    gdf = gdf.rename(columns=SHAPEFILE_COLUMNS)
+    if filters:
+        gdf = apply_filters(gdf, filters)
+    if columns is not None:
+        gdf = gdf[list(columns) + [gdf.geometry.name]]
+    return gdf
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import pickle
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.patches as mpatches
+import matplotlib.pyplot as plt
+
+from basemap_cache import add_offline_basemap, clip_to_store
+from cache_utils import CACHE_DIR
+from geometry_io import read_wkt_csv
+from layer_io import read_layer
+
+path = os.getcwd()
+
+ATLAS_DIR = os.path.join(path, "Maps/Atlas")
+ATLAS_CACHE_DIR = os.path.join(CACHE_DIR, "atlas")
+
+# layers an atlas can draw, each read and projected to web mercator once per run
+LAYERS = {
+    "neighborhoods": lambda: read_wkt_csv(os.path.join(path, "Data/Raw/Neighborhoods.csv")),
+    "tif_districts": lambda: read_layer("tif_districts", columns=["TIF_name"]),
+    "rail_lines": lambda: read_layer("rail_lines", columns=[]),
+    "bus_routes": lambda: read_layer("bus_routes", columns=[]),
+    "etod_lots_tifs": lambda: read_layer("etod_lots_tifs", columns=[]),
+    "vacant_buildings": lambda: read_layer("vacant_buildings", columns=[]),
+    "sale_buildings": lambda: read_layer("sale_buildings", columns=[]),
+}
+
+# one atlas per entry: a page for every row of `areas` (named by its `key` column).
+# `layers` are drawn in order with their geopandas plot() arguments, the layer "area"
+# is the page's own area. `legend` entries are matplotlib Patch arguments.
+# the same structure can be given as JSON with --spec
+ATLASES = [
+    {
+        "name": "tif_districts",
+        "areas": "tif_districts",
+        "key": "TIF_name",
+        "title": "{name}: ETOD Eligible City Owned Vacant Lots",
+        "layers": [
+            {"layer": "neighborhoods", "edgecolor": "black", "color": "none", "linewidth": 2, "alpha": 0.1, "zorder": 3},
+            {"layer": "tif_districts", "color": "purple", "alpha": 0.5, "zorder": 1},
+            {"layer": "area", "color": "purple", "zorder": 2},
+            {"layer": "area", "edgecolor": "black", "color": "none", "linewidth": 2, "zorder": 4},
+            {"layer": "rail_lines", "color": "limegreen", "alpha": 0.6, "zorder": 5},
+            {"layer": "bus_routes", "color": "darkgreen", "alpha": 0.6, "zorder": 6},
+            {"layer": "etod_lots_tifs", "color": "skyblue", "markersize": 4, "zorder": 7},
+        ],
+        "legend": [
+            {"color": "purple", "label": "TIF Districts"},
+            {"color": "limegreen", "label": "Metra and CTA 'L' Lines", "alpha": 0.6},
+            {"color": "darkgreen", "label": "Eligible Bus Corridors", "alpha": 0.6},
+            {"color": "skyblue", "label": "ETOD Eligible City Owned Vacant Lots"},
+            {"facecolor": "none", "edgecolor": "black", "label": "Community Area Boundary"},
+        ],
+    },
+    {
+        "name": "neighborhoods",
+        "areas": "neighborhoods",
+        "key": "PRI_NEIGH",
+        "title": "{name}: Vacant Buildings and Buildings for Sale",
+        "layers": [
+            {"layer": "neighborhoods", "edgecolor": "black", "color": "none", "linewidth": 2, "zorder": 2},
+            {"layer": "vacant_buildings", "color": "green", "markersize": 30, "zorder": 3},
+            {"layer": "sale_buildings", "color": "black", "markersize": 30, "zorder": 4},
+        ],
+        "legend": [
+            {"color": "green", "label": "Vacant Buildings"},
+            {"color": "black", "label": "Buildings for Sale"},
+        ],
+    },
+]
+
+# meters of context around each area, the basemap zoom and the resolution of a page
+MARGIN = 600
+ZOOM = 15
+DPI = 150
+
+
+def slug(name):
+    return re.sub(r"[^a-z0-9]+", "_", str(name).lower()).strip("_")
+
+
+def prepare_layers(names):
+    """Read and project the layers once, pickled for the worker processes."""
+    layers = {name: LAYERS[name]().to_crs(epsg=3857) for name in names}
+    os.makedirs(ATLAS_CACHE_DIR, exist_ok=True)
+    layers_path = os.path.join(ATLAS_CACHE_DIR, f"layers_{os.getpid()}.pkl")
+    with open(layers_path, "wb") as f:
+        pickle.dump(layers, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return layers, layers_path
+
+
+_layers = None
+
+
+def init_worker(layers_path):
+    """Load the projected layers once per worker process."""
+    global _layers
+    with open(layers_path, "rb") as f:
+        _layers = pickle.load(f)
+
+
+def render_page(atlas, name, out_path):
+    """Draw one area of an atlas and save it."""
+    areas = _layers[atlas["areas"]]
+    area = areas[areas[atlas["key"]] == name]
+    # the margin of an area on the edge of the city can reach past the stored basemap
+    xmin, ymin, xmax, ymax = clip_to_store(*area.buffer(atlas.get("margin", MARGIN)).total_bounds)
+    if xmin >= xmax or ymin >= ymax:
+        raise ValueError(f"{name} is outside the area the basemap is stored for")
+
+    fig, ax = plt.subplots(figsize=(10, 10))
+    for spec in atlas["layers"]:
+        kwargs = {k: v for k, v in spec.items() if k != "layer"}
+        gdf = area if spec["layer"] == "area" else _layers[spec["layer"]].cx[xmin:xmax, ymin:ymax]
+        if len(gdf):
+            gdf.plot(ax=ax, **kwargs)
+
+    if atlas.get("legend"):
+        legend = ax.legend(handles=[mpatches.Patch(**patch) for patch in atlas["legend"]],
+                           loc="upper left", framealpha=1, fontsize=8)
+        legend.get_frame().set_facecolor("white")
+
+    # zoom in first so only the tiles around the area are read
+    ax.set_xlim([xmin, xmax])
+    ax.set_ylim([ymin, ymax])
+    add_offline_basemap(ax, alpha=0.5, zoom=atlas.get("zoom", ZOOM))
+    ax.set_axis_off()
+    ax.set_title(atlas["title"].format(name=name))
+
+    tmp_path = out_path + ".tmp.png"
+    fig.savefig(tmp_path, dpi=atlas.get("dpi", DPI))
+    plt.close(fig)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def run_atlas(atlases=ATLASES, folder=ATLAS_DIR, workers=None, only=None):
+    """Render every page of every atlas across a process pool, returns the files written."""
+    names = {spec["layer"] for atlas in atlases for spec in atlas["layers"]} - {"area"}
+    layers, layers_path = prepare_layers(names | {atlas["areas"] for atlas in atlases})
+
+    pages = []
+    for atlas in atlases:
+        atlas_dir = os.path.join(folder, atlas["name"])
+        os.makedirs(atlas_dir, exist_ok=True)
+        for name in sorted(layers[atlas["areas"]][atlas["key"]].dropna().unique()):
+            if only is None or name in only:
+                pages.append((atlas, name, os.path.join(atlas_dir, slug(name) + ".png")))
+    del layers
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=init_worker,
+                                 initargs=(layers_path,)) as pool:
+            return list(pool.map(render_page, *zip(*pages))) if pages else []
+    finally:
+        os.remove(layers_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a zoomed map of every TIF district and neighborhood.")
+    parser.add_argument("atlases", nargs="*", help="atlases to render (default: all)")
+    parser.add_argument("--spec", help="JSON file with a list of atlases, replacing the built-in ones")
+    parser.add_argument("--only", nargs="+", help="only render these areas, e.g. --only Englewood")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--output", default=ATLAS_DIR, help="folder the atlases are written to")
+    args = parser.parse_args(argv)
+
+    atlases = ATLASES
+    if args.spec:
+        with open(args.spec) as f:
+            atlases = json.load(f)
+    if args.atlases:
+        unknown = set(args.atlases) - {atlas["name"] for atlas in atlases}
+        if unknown:
+            parser.error(f"unknown atlases: {sorted(unknown)}")
+        atlases = [atlas for atlas in atlases if atlas["name"] in args.atlases]
+
+    start = time.time()
+    written = run_atlas(atlases, args.output, args.workers, args.only)
+    print(f"{len(written)} maps written to {os.path.relpath(args.output, path)} in {time.time() - start:.0f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
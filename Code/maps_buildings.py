@@ -1,22 +1,18 @@
 import pandas as pd
 import geopandas as gpd
-from shapely import wkt
 import os
-import contextily as ctx
+from basemap_cache import add_offline_basemap
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from layer_io import read_layer
+from geometry_io import read_wkt_csv
 
 path = os.getcwd()
 
-sale_buildings_gdf = gpd.read_file(os.path.join(path, "Data/Processed/sale_buildings.shp"))
-vacant_buildings_gdf = gpd.read_file(os.path.join(path, "Data/Processed/vacant_buildings.shp"))
-merged_neighborhoods_gdf = gpd.read_file(os.path.join(path, "Data/Processed/neighborhood_level.shp"))
-neighborhoods = pd.read_csv(os.path.join(path, "Data/Raw/Neighborhoods.csv"))
-
-#Data processing for consistency 
-neighborhoods["geometry"] = neighborhoods["the_geom"].apply(wkt.loads)
-neighborhood_gdf = gpd.GeoDataFrame(neighborhoods, geometry="geometry")
-neighborhood_gdf = neighborhood_gdf.set_crs("EPSG:4326", inplace=True)
+sale_buildings_gdf = read_layer("sale_buildings", columns=["Neigh"])
+vacant_buildings_gdf = read_layer("vacant_buildings", columns=["Neigh"])
+merged_neighborhoods_gdf = read_layer("neighborhood_level", columns=["percent_change"])
+neighborhood_gdf = read_wkt_csv(os.path.join(path, "Data/Raw/Neighborhoods.csv"))
 
 #Chicago map by gentrification
 fig, ax = plt.subplots(figsize=(10,10))
@@ -25,7 +21,7 @@ neighborhood_gdf.dissolve().boundary.to_crs(epsg=3857).plot(ax=ax,
                                                             linewidth=1, 
                                                             zorder=1)
 merged_neighborhoods_gdf.to_crs(epsg=3857).plot(ax=ax, 
-                                                column="percent_ch", 
+                                                column="percent_change", 
                                                 legend_kwds={'label': "Percent Change in Avg. Assessed Value from 2000 to 2023", "orientation": "vertical"},
                                                 cmap='Reds', 
                                                 legend=True, 
@@ -43,7 +39,7 @@ legend = [
     mpatches.Patch(color='black', label="Buildings for Sale")]
 ax.legend(handles=legend, loc="upper right", fontsize=8)
 
-ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron, alpha=0.5)
+add_offline_basemap(ax, alpha=0.5)
 ax.set_axis_off()
 ax.set_title("Vacant Buildings and Buildings for Sale by Neighborhood Gentrification")
 
@@ -77,11 +73,12 @@ legend = [
 
 ax.legend(handles=legend, loc="upper left", fontsize=6)
 
-ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron, alpha=0.5, zoom=15)
-ax.set_axis_off()
-
+# zoom in first so only the tiles around the neighborhood are read
 ax.set_xlim([xmin, xmax])
 ax.set_ylim([ymin, ymax])
+
+add_offline_basemap(ax, alpha=0.5, zoom=15)
+ax.set_axis_off()
 ax.set_title("Garfield Park: Vacant Buildings and Buildings for Sale")
 
 plt.savefig(os.path.join(path, "Maps/Garfield_park_buildings.png"), dpi=200)
@@ -1,48 +1,20 @@
 import pandas as pd
 import geopandas as gpd
-from shapely import wkt
 import os
-import contextily as ctx
+from basemap_cache import add_offline_basemap
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
-from shapely.ops import unary_union, linemerge
+from layer_io import read_layer
+from geometry_io import read_wkt_csv
 
 path = os.getcwd()
 
-tif_districts_gdf = gpd.read_file(os.path.join(path, "Data/Processed/tif_districts.shp"))
-metra_lines_gdf = gpd.read_file(os.path.join(path, "Data/Raw/MetraLinesshp.shp"))
-l_lines = pd.read_csv(os.path.join(path, "Data/Raw/CTA_l_lines.csv"))
-bus_routes_gdf = gpd.read_file(os.path.join(path, "Data/Processed/bus_routes.shp"))
-etod_lots_tifs = gpd.read_file(os.path.join(path, "Data/Processed/etod_lots_tifs.shp"))
-neighborhoods = pd.read_csv(os.path.join(path, "Data/Raw/Neighborhoods.csv"))
-
-#initial data processing steps
-neighborhoods["geometry"] = neighborhoods["the_geom"].apply(wkt.loads)
-neighborhood_gdf = gpd.GeoDataFrame(neighborhoods, geometry="geometry")
-neighborhood_gdf = neighborhood_gdf.set_crs("EPSG:4326", inplace=True)
-
-#convert to geopandas and set coordinate system
-l_lines["the_geom"] = l_lines["the_geom"].apply(wkt.loads)
-l_lines_gdf = gpd.GeoDataFrame(l_lines, geometry="the_geom")
-l_lines_gdf = l_lines_gdf.set_crs(epsg=4326, inplace=True)
-
-metra_lines_gdf.to_crs(epsg=4326, inplace=True)
-
-#clip metra lines to chicago extent
-metra_lines_chi_gdf = gpd.clip(metra_lines_gdf, neighborhood_gdf)
-
-# keep unique sections of rail lines
-all_geometries = l_lines_gdf.geometry.tolist() + metra_lines_chi_gdf.geometry.tolist()
-
-# Merge all rail lines into a single unified geometry
-merged_lines = linemerge(unary_union(all_geometries))
-unique_lines = list(merged_lines.geoms)
-rail_gdf_unique = gpd.GeoDataFrame(geometry=unique_lines, crs=l_lines_gdf.crs)
-
-merged_lines_bus = linemerge(unary_union(bus_routes_gdf.geometry))
-# Convert back to individual unique LineStrings
-unique_lines_bus = list(merged_lines_bus.geoms) 
-bus_gdf_unique = gpd.GeoDataFrame(geometry=unique_lines_bus, crs=bus_routes_gdf.crs)
+tif_districts_gdf = read_layer("tif_districts", columns=[])
+#deduplicated rail and bus corridor linework from the transit network
+rail_gdf_unique = read_layer("rail_lines", columns=[])
+bus_gdf_unique = read_layer("bus_routes", columns=[])
+etod_lots_tifs = read_layer("etod_lots_tifs", columns=[])
+neighborhood_gdf = read_wkt_csv(os.path.join(path, "Data/Raw/Neighborhoods.csv"))
 
 #plot ETOD eligible lots in all of Chicago
 fig, ax = plt.subplots(figsize=(10,10))
@@ -79,7 +51,7 @@ legend_patches = [
 ]
 ax.legend(handles=legend_patches, loc="upper right", fontsize=8)
 
-ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron, alpha=0.5)
+add_offline_basemap(ax, alpha=0.5)
 ax.set_axis_off()
 ax.set_title("ETOD Eligible City Owned Vacant Lots in TIF Districts")
 
@@ -144,11 +116,12 @@ legend = ax.legend(handles=legend_patches, loc="upper left", framealpha=1, fonts
 legend.get_frame().set_facecolor('white')
 legend.get_frame().set_alpha(1) 
 
-ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron, alpha=0.5, zoom=15)
-ax.set_axis_off()
-
+# zoom in first so only the tiles around the neighborhood are read
 ax.set_xlim([xmin, xmax])
 ax.set_ylim([ymin, ymax])
+
+add_offline_basemap(ax, alpha=0.5, zoom=15)
+ax.set_axis_off()
 ax.set_title("Englewood: ETOD Eligible City Owned Vacant Lots in TIF Districts")
 
 plt.savefig(os.path.join(path, "Maps/englewood_ETOD_vacant_lots.png"), dpi=300)
@@ -0,0 +1,265 @@
+import argparse
+import ast
+import hashlib
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from cache_utils import CACHE_DIR, dataset_digest, load_json, save_json
+from layer_io import (DASHBOARD_LAYERS, PROCESSED_DIR, SIMPLIFIED_LAYERS, SIMPLIFY_ZOOMS,
+                      layer_outputs, layer_path, simplified_name)
+from transit_network import MANIFEST_PATH, NETWORK_LAYERS
+
+path = os.getcwd()
+
+STATE_FILE = os.path.join(CACHE_DIR, "pipeline_state.json")
+
+
+def processed(*names):
+    """Data/Processed paths of layers read by a stage."""
+    return [os.path.relpath(layer_path(name), path) for name in names]
+
+
+def tilesets(*names):
+    """Vector tile files written by Code/vector_tiles.py."""
+    return [os.path.relpath(os.path.join(PROCESSED_DIR, "tiles", name + ".mbtiles"), path) for name in names]
+
+
+# each stage is one script with the files it reads and the files it writes.
+# a stage depends on another stage when it reads one of its outputs
+STAGES = [
+    {
+        "name": "transit_network",
+        "script": "Code/transit_network.py",
+        "inputs": ["Data/Raw/CTA_System_Information_List_of_L_Stops.csv",
+                   "Data/Raw/MetraStations.shp",
+                   "Data/Raw/bus_routes.shp",
+                   "Data/Raw/MetraLinesshp.shp",
+                   "Data/Raw/CTA_l_lines.csv",
+                   "Data/Raw/Neighborhoods.csv"],
+        "outputs": layer_outputs(NETWORK_LAYERS) + [os.path.relpath(MANIFEST_PATH, path)],
+    },
+    {
+        "name": "vacant_lots",
+        "script": "Code/cleaning_vacant_lot_data.py",
+        "inputs": ["Data/Raw/Boundaries_Tax_Increment_Financing_Districts.csv",
+                   "Data/Raw/City-Owned_Land_Inventory_20250320.csv",
+                   "Data/Raw/zone min unit area.csv",
+                   "Data/Raw/zoning_policy_rules.csv",
+                   "Data/Raw/Boundaries_-_Zoning_Districts__current__20250404.csv",
+                   os.path.relpath(MANIFEST_PATH, path)] + processed("transit_stops", "bus_network"),
+        "outputs": layer_outputs(["tif_districts", "metra_stops", "l_stops",
+                                  "bus_routes", "etod_lots_tifs", "lot_candidates"]),
+    },
+    {
+        "name": "assessed_values",
+        "script": "Code/assessed_value_cube.py",
+        "inputs": ["Data/merged_gdf_shapefile/merged_gdf_shapefile.dbf"],
+        "outputs": ["Data/Processed/assessed_value_cube.parquet"],
+    },
+    {
+        "name": "buildings",
+        "script": "Code/cleaning_building_data.py",
+        "inputs": ["Data/Raw/311_Service_Requests_20250330.csv",
+                   "Data/Raw/Neighborhoods.csv",
+                   "Data/Raw/Crexi_Building_Data.csv",
+                   "Data/Raw/zone min unit area.csv",
+                   "Data/Raw/zoning_policy_rules.csv",
+                   "Data/Processed/assessed_value_cube.parquet",
+                   "Data/Raw/Assessor_-_Parcel_Addresses_20250403.csv",
+                   "Data/Raw/Assessor_-_Single_and_Multi-Family_Improvement_Characteristics_20250403.csv",
+                   "Data/Raw/Boundaries_-_Zoning_Districts__current__20250404.csv",
+                   "Data/Raw/vacant_building_addresses.csv"],
+        "outputs": layer_outputs(["vacant_buildings", "sale_buildings", "neighborhood_level"]) +
+                   ["Data/Processed/address_index.parquet"],
+    },
+    {
+        "name": "maps_vacant_lots",
+        "script": "Code/maps_vacant_lots.py",
+        "inputs": processed("tif_districts", "rail_lines", "bus_routes", "etod_lots_tifs") +
+                  ["Data/Raw/Neighborhoods.csv"],
+        "outputs": ["Maps/ETOD_vacant_lots.png",
+                    "Maps/englewood_ETOD_vacant_lots.png"],
+    },
+    {
+        "name": "maps_buildings",
+        "script": "Code/maps_buildings.py",
+        "inputs": processed("sale_buildings", "vacant_buildings", "neighborhood_level") +
+                  ["Data/Raw/Neighborhoods.csv"],
+        "outputs": ["Maps/Chicago_buildings.png",
+                    "Maps/Garfield_park_buildings.png"],
+    },
+    {
+        "name": "simplify_layers",
+        "script": "Code/simplify_layers.py",
+        "inputs": processed(*SIMPLIFIED_LAYERS),
+        "outputs": layer_outputs([simplified_name(name, zoom)
+                                  for name in SIMPLIFIED_LAYERS for zoom in SIMPLIFY_ZOOMS]),
+    },
+    {
+        "name": "vector_tiles",
+        "script": "Code/vector_tiles.py",
+        "inputs": processed(*DASHBOARD_LAYERS),
+        "outputs": tilesets(*DASHBOARD_LAYERS),
+    },
+    {
+        "name": "shared_layers",
+        "script": "Code/export_shared_layers.py",
+        "inputs": processed(*DASHBOARD_LAYERS),
+        "outputs": [os.path.relpath(os.path.join(PROCESSED_DIR, "shared", name + ".arrow"), path)
+                    for name in DASHBOARD_LAYERS],
+    },
+]
+
+
+def stage_dependencies(stages):
+    """Map each stage name to the names of the stages that produce its inputs."""
+    producers = {output: stage["name"] for stage in stages for output in stage["outputs"]}
+    return {stage["name"]: {producers[i] for i in stage["inputs"] if i in producers} - {stage["name"]}
+            for stage in stages}
+
+
+def local_imports(script, seen=None):
+    """Paths of the modules in the script's folder that it imports, directly or through
+    other local modules, so editing a shared helper reruns every stage using it."""
+    seen = set() if seen is None else seen
+    folder = os.path.dirname(script)
+    with open(os.path.join(path, script)) as f:
+        tree = ast.parse(f.read(), filename=script)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            module = os.path.join(folder, name.split(".")[0] + ".py")
+            if module != script and module not in seen and os.path.exists(os.path.join(path, module)):
+                seen.add(module)
+                local_imports(module, seen)
+    return sorted(seen)
+
+
+def stage_digest(stage, known_files):
+    """Digest of a stage's script, the local modules it imports and its inputs, used to
+    decide whether it has to run. Raises FileNotFoundError naming missing inputs."""
+    parts = [stage["script"]] + local_imports(stage["script"]) + stage["inputs"]
+    missing = [p for p in parts if not os.path.exists(os.path.join(path, p))]
+    if missing:
+        raise FileNotFoundError(f"missing {', '.join(missing)}")
+    digest = hashlib.sha256()
+    for p in parts:
+        digest.update(f"{p}:{dataset_digest(os.path.join(path, p), known_files)}\n".encode())
+    return digest.hexdigest()
+
+
+def is_up_to_date(stage, digest, state):
+    if state.get("stages", {}).get(stage["name"]) != digest:
+        return False
+    return all(os.path.exists(os.path.join(path, o)) for o in stage["outputs"])
+
+
+def run_stage(stage):
+    start = time.time()
+    result = subprocess.run([sys.executable, os.path.join(path, stage["script"])], cwd=path)
+    return result.returncode, time.time() - start
+
+
+def run_pipeline(stages=STAGES, selected=None, force=False, jobs=None, dry_run=False):
+    """Run every stage whose inputs changed since its last successful run.
+
+    Stages run as soon as the stages they depend on have finished, so independent
+    stages run at the same time. A stage missing an input fails on its own, its
+    dependents are skipped. Returns True if no stage failed.
+    """
+    state = load_json(STATE_FILE)
+    state.setdefault("stages", {})
+    known_files = state.setdefault("files", {})
+    deps = stage_dependencies(stages)
+    by_name = {stage["name"]: stage for stage in stages}
+    pending = [s["name"] for s in stages if selected is None or s["name"] in selected]
+    finished, failed, would_run = set(), set(), set()
+    # stages that are not part of this run count as finished
+    finished.update(name for name in by_name if name not in pending)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs or len(stages)) as pool:
+        while pending or running:
+            progressed = False
+            for name in list(pending):
+                if deps[name] & failed:
+                    print(f"[skip] {name}: upstream stage failed")
+                    pending.remove(name)
+                    failed.add(name)
+                    progressed = True
+                    continue
+                if not deps[name] <= finished:
+                    continue
+                pending.remove(name)
+                progressed = True
+                stage = by_name[name]
+                if dry_run and deps[name] & would_run:
+                    # its inputs would be rewritten first, and may not exist yet
+                    print(f"[would run] {name}")
+                    would_run.add(name)
+                    finished.add(name)
+                    continue
+                # hash inputs only once upstream stages have written them
+                try:
+                    digest = stage_digest(stage, known_files)
+                except FileNotFoundError as error:
+                    print(f"[failed] {name}: {error}")
+                    failed.add(name)
+                    continue
+                if not force and is_up_to_date(stage, digest, state):
+                    print(f"[cached] {name}")
+                    finished.add(name)
+                elif dry_run:
+                    print(f"[would run] {name}")
+                    would_run.add(name)
+                    finished.add(name)
+                else:
+                    print(f"[run] {name}")
+                    running[pool.submit(run_stage, stage)] = (name, digest)
+
+            if not running:
+                if pending and not progressed:
+                    raise RuntimeError(f"stages can never run, check for a dependency cycle: {pending}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, digest = running.pop(future)
+                returncode, elapsed = future.result()
+                if returncode == 0:
+                    print(f"[done] {name} ({elapsed:.1f}s)")
+                    state["stages"][name] = digest
+                    finished.add(name)
+                else:
+                    print(f"[failed] {name} (exit code {returncode})")
+                    state["stages"].pop(name, None)
+                    failed.add(name)
+                save_json(state, STATE_FILE)
+
+    if not dry_run:
+        save_json(state, STATE_FILE)
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the analysis scripts as an incremental pipeline.")
+    parser.add_argument("stages", nargs="*", help="only run these stages (default: all)")
+    parser.add_argument("--force", action="store_true", help="run stages even if their inputs have not changed")
+    parser.add_argument("--jobs", type=int, default=None, help="maximum number of stages to run at once")
+    parser.add_argument("--dry-run", action="store_true", help="only print which stages would run")
+    args = parser.parse_args()
+
+    unknown = set(args.stages) - {stage["name"] for stage in STAGES}
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    ok = run_pipeline(selected=set(args.stages) or None, force=args.force,
+                      jobs=args.jobs, dry_run=args.dry_run)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,389 @@
+import argparse
+import hashlib
+import itertools
+import os
+import pickle
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cache_utils import CACHE_DIR, dataset_digest
+from etod_eligibility import CORRIDOR_DISTANCE, ETOD_CORRIDORS, STOP_DISTANCE, route_distances
+from geometry_io import read_wkt_csv
+from layer_io import layer_path, read_layer
+from transit_network import network_hash, route_lines
+from unit_capacity import BUILDING_DEFAULTS, LOT_DEFAULTS, scenario_matrix, site_arrays, unit_capacity
+from zoning_rules import RULES_PATH, UNIT_AREA_PATH, apply_zoning_rules, load_rules
+
+path = os.getcwd()
+
+SWEEP_CACHE_DIR = os.path.join(CACHE_DIR, "sweep")
+OUTPUT_PATH = os.path.join(path, "Data/Processed/scenario_sweep.parquet")
+NEIGHBORHOODS_PATH = os.path.join(path, "Data/Raw/Neighborhoods.csv")
+
+# bus corridor distances are precomputed up to this far, scenarios can't go further
+MAX_CORRIDOR_DISTANCE = 1609.34
+
+# scenario levers besides the unit capacity parameters (see unit_capacity.py, which can
+# be set for both sources or only one with a lot_ or building_ prefix)
+#   stop_distance      meters from an 'L' or Metra stop for a lot to be ETOD eligible
+#   corridor_distance  meters from an eligible bus corridor for a lot to be ETOD eligible
+#   corridors          comma separated bus routes that count as ETOD corridors
+#   rezone             comma separated patterns of the re-zoning rules that apply (see
+#                      zoning_policy_rules.csv, e.g. "RS-1,RS-2" or "PD"), "all" or "none".
+#                      True and False also mean all and none
+SWEEP_DEFAULTS = {"stop_distance": STOP_DISTANCE,
+                  "corridor_distance": CORRIDOR_DISTANCE,
+                  "corridors": ",".join(ETOD_CORRIDORS),
+                  "rezone": "all"}
+
+SOURCES = ["lots", "vacant_buildings", "sale_buildings"]
+LEVELS = ["tif", "neighborhood", "city"]
+
+
+def scenario_grid(**levers):
+    """Every combination of the given lever values as a scenario frame.
+
+    scenario_grid(stop_distance=[400, 804.67], min_unit_size=[600, 720, 900])
+    gives 6 scenarios.
+    """
+    names = list(levers)
+    return pd.DataFrame(list(itertools.product(*levers.values())), columns=names)
+
+
+def split_names(value):
+    """Names in a comma separated lever, without surrounding whitespace."""
+    return [name.strip() for name in str(value).split(",") if name.strip()]
+
+
+def rezone_selection(value, patterns):
+    """The re-zoning rule patterns a rezone lever selects, comma separated in rule order."""
+    if isinstance(value, (bool, np.bool_, int, float, np.number)):
+        value = "all" if value else "none"
+    if str(value).strip().lower() in ("all", "true"):
+        return ",".join(patterns)
+    if str(value).strip().lower() in ("none", "false", ""):
+        return ""
+    names = split_names(value)
+    unknown = set(names) - set(patterns)
+    if unknown:
+        raise ValueError(f"unknown re-zoning rules {sorted(unknown)}, the rules are {patterns}")
+    return ",".join(pattern for pattern in patterns if pattern in names)
+
+
+def network_routes():
+    """Every bus route in the transit network."""
+    return set(route_lines(read_layer("bus_network", columns=["routes"]))["route"])
+
+
+def corridor_selection(value, routes):
+    """A corridors lever as comma separated route names, checked against the network."""
+    names = split_names(value)
+    unknown = set(names) - set(routes)
+    if unknown:
+        raise ValueError(f"unknown bus routes in corridors: {sorted(unknown)}")
+    return ",".join(names)
+
+
+def sweep_matrix(scenarios, rules=None, routes=None):
+    """Check the scenario levers and fill in defaults for the ones not set."""
+    rules = load_rules() if rules is None else rules
+    routes = network_routes() if routes is None else routes
+    scenarios = pd.DataFrame(scenarios).reset_index(drop=True)
+    capacity = set(LOT_DEFAULTS) | {f"lot_{name}" for name in LOT_DEFAULTS} | \
+        {f"building_{name}" for name in BUILDING_DEFAULTS}
+    unknown = set(scenarios.columns) - set(SWEEP_DEFAULTS) - capacity
+    if unknown:
+        raise ValueError(f"unknown scenario levers: {sorted(unknown)}")
+    for name, value in SWEEP_DEFAULTS.items():
+        scenarios[name] = scenarios[name].fillna(value) if name in scenarios else value
+    if (scenarios["corridor_distance"] > MAX_CORRIDOR_DISTANCE).any():
+        raise ValueError(f"corridor_distance can be at most {MAX_CORRIDOR_DISTANCE} meters")
+    patterns = list(dict.fromkeys(rules.loc[rules["rule"] == "rezone", "pattern"]))
+    scenarios["rezone"] = [rezone_selection(value, patterns) for value in scenarios["rezone"]]
+    scenarios["corridors"] = [corridor_selection(value, routes) for value in scenarios["corridors"]]
+    return scenarios
+
+
+def capacity_scenarios(scenarios, prefix, defaults):
+    """Unit capacity scenario matrix for one source, prefixed levers win over shared ones.
+
+    A blank prefixed lever falls back to the shared one, then to the default.
+    """
+    params = {}
+    for name in defaults:
+        for column in (f"{prefix}_{name}", name):
+            if column in scenarios:
+                values = pd.to_numeric(scenarios[column]).reset_index(drop=True)
+                params[name] = values if name not in params else params[name].fillna(values)
+    return scenario_matrix(defaults, pd.DataFrame(params, index=range(len(scenarios))))
+
+
+def group_codes(values, names):
+    codes = pd.Categorical(values, categories=names).codes
+    return np.asarray(codes, dtype=np.int64)
+
+
+def group_sum(values, codes, n_groups):
+    """Sum of the rows of `values` (sites, scenarios) by group code, shape (groups, scenarios).
+
+    Sites with code -1 (no group) are left out.
+    """
+    keep = codes >= 0
+    values, codes = values[keep], codes[keep]
+    out = np.zeros((n_groups, values.shape[1]))
+    if len(codes) == 0:
+        return out
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    out[sorted_codes[starts]] = np.add.reduceat(values[order], starts, axis=0)
+    return out
+
+
+def site_capacity(table, rules, unit_area, rezone):
+    """Site attributes for unit_capacity with only the `rezone` re-zoning rules applied.
+
+    Computed once per selection of rules and kept in the table.
+    """
+    if rezone not in table["capacity"]:
+        selected = rules["pattern"].isin(rezone.split(",") if rezone else [])
+        zoned = apply_zoning_rules(table["zoning_sites"], "zoning",
+                                   rules.loc[(rules["rule"] != "rezone") | selected], unit_area)
+        far_applies = table["far_applies"]
+        flags = zoned[far_applies] == 1 if far_applies else True
+        table["capacity"][rezone] = {name: np.asarray(values) if np.ndim(values) else values
+                                     for name, values in site_arrays(zoned, table["sq_ft_column"], flags).items()}
+    return table["capacity"][rezone]
+
+
+def site_table(gdf, source, sq_ft_column, far_applies, tifs, neighborhoods, rules, unit_area):
+    """Everything about a source's sites that doesn't change between scenarios.
+
+    Unit capacity attributes are precomputed with all and with none of the re-zoning
+    rules, other selections are computed when a scenario first asks for them.
+    """
+    sites = gpd.sjoin(gdf, neighborhoods[["PRI_NEIGH", neighborhoods.geometry.name]],
+                      how="left", predicate="within")
+    sites = sites[~sites.index.duplicated()].drop(columns="index_right")
+    if "TIF_name" not in sites:
+        sites = gpd.sjoin(sites, tifs[["TIF_name", tifs.geometry.name]], how="left", predicate="within")
+        sites = sites[~sites.index.duplicated()].drop(columns="index_right")
+    sites = sites.reset_index(drop=True)
+
+    table = {"source": source,
+             "sites": sites,
+             "zoning_sites": pd.DataFrame(sites[["zoning", sq_ft_column] + ([far_applies] if far_applies else [])]),
+             "sq_ft_column": sq_ft_column,
+             "far_applies": far_applies,
+             "capacity": {},
+             "zoning": pd.factorize(sites["zoning"])[0]}
+    patterns = list(dict.fromkeys(rules.loc[rules["rule"] == "rezone", "pattern"]))
+    for rezone in (",".join(patterns), ""):
+        site_capacity(table, rules, unit_area, rezone)
+    return table
+
+
+def prepare_sites():
+    """Site tables for lots and buildings, with precomputed transit distances.
+
+    The spatial joins and distance queries only depend on the input layers, so they
+    are run once and cached under Data/Cache/sweep, keyed on the inputs.
+    """
+    inputs = [layer_path("lot_candidates"), layer_path("vacant_buildings"), layer_path("sale_buildings"),
+              layer_path("tif_districts"), NEIGHBORHOODS_PATH, RULES_PATH, UNIT_AREA_PATH] + \
+        [os.path.join(os.path.dirname(os.path.abspath(__file__)), module)
+         for module in ("scenario_sweep.py", "zoning_rules.py", "unit_capacity.py", "etod_eligibility.py")]
+    # bus routes come from the transit network, keyed on its content hash
+    digest = hashlib.sha256(("".join(dataset_digest(file) for file in inputs) + network_hash()).encode()).hexdigest()
+    cache_path = os.path.join(SWEEP_CACHE_DIR, f"sites-{digest[:16]}.pkl")
+    if os.path.exists(cache_path):
+        return cache_path
+
+    rules = load_rules()
+    unit_area = pd.read_csv(UNIT_AREA_PATH)
+    tifs = read_layer("tif_districts", columns=["TIF_name"])
+    neighborhoods = read_wkt_csv(NEIGHBORHOODS_PATH)
+    bus_routes = route_lines(read_layer("bus_network"))
+
+    lots = read_layer("lot_candidates")
+    vacant = read_layer("vacant_buildings", columns=["zoning", "SqFt", "Calc_Flg"])
+    sale = read_layer("sale_buildings", columns=["zoning", "SqFt", "Calc_Flg"])
+    tables = [site_table(lots, "lots", "sq_ft", None, tifs, neighborhoods, rules, unit_area),
+              site_table(vacant, "vacant_buildings", "SqFt", "Calc_Flg", tifs, neighborhoods, rules, unit_area),
+              site_table(sale, "sale_buildings", "SqFt", "Calc_Flg", tifs, neighborhoods, rules, unit_area)]
+
+    # lots are only counted when ETOD eligible, keep their distance to stops and to every route
+    routes = np.asarray(sorted(bus_routes["route"].unique()), dtype=object)
+    pairs = route_distances(tables[0]["sites"], bus_routes, "route", MAX_CORRIDOR_DISTANCE)
+    tables[0]["stop_dist"] = tables[0]["sites"]["stop_dist_m"].to_numpy(dtype=float)
+    tables[0]["route_pairs"] = {"site": pairs["site"].to_numpy(),
+                                "route": group_codes(pairs["route"], routes),
+                                "dist": pairs["dist_m"].to_numpy()}
+
+    tif_names = np.asarray(sorted(tifs["TIF_name"].dropna().unique()), dtype=object)
+    neighborhood_names = np.asarray(sorted(neighborhoods["PRI_NEIGH"].dropna().unique()), dtype=object)
+    for table in tables:
+        table["tif"] = group_codes(table["sites"]["TIF_name"], tif_names)
+        table["neighborhood"] = group_codes(table["sites"]["PRI_NEIGH"], neighborhood_names)
+        del table["sites"]
+
+    prepared = {"tables": tables, "routes": routes, "rules": rules, "unit_area": unit_area,
+                "names": {"tif": tif_names, "neighborhood": neighborhood_names, "city": np.array(["Chicago"], dtype=object)}}
+    os.makedirs(SWEEP_CACHE_DIR, exist_ok=True)
+    tmp_path = cache_path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(prepared, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def lot_eligibility(table, routes, scenarios):
+    """Whether each lot is ETOD eligible in each scenario, shape (lots, scenarios)."""
+    eligible = table["stop_dist"][:, None] <= scenarios["stop_distance"].to_numpy()[None, :]
+    pairs = table["route_pairs"]
+    if len(pairs["site"]):
+        corridors = np.stack([np.isin(routes, split_names(value)) for value in scenarios["corridors"]], axis=1)
+        pair_ok = corridors[pairs["route"]] & \
+            (pairs["dist"][:, None] <= scenarios["corridor_distance"].to_numpy()[None, :])
+        # route pairs are sorted by site, reduce each site's pairs at once
+        starts = np.flatnonzero(np.r_[True, pairs["site"][1:] != pairs["site"][:-1]])
+        eligible[pairs["site"][starts]] |= np.logical_or.reduceat(pair_ok, starts, axis=0)
+    return eligible
+
+
+def impute_by_zone(units, included, zoning):
+    """Fill lots with unknown units with the mean for their zone class, per scenario."""
+    known = included & ~np.isnan(units)
+    n_zones = zoning.max() + 1 if len(zoning) else 0
+    sums = group_sum(np.where(known, units, 0.0), zoning, n_zones)
+    counts = group_sum(known.astype(float), zoning, n_zones)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.floor(sums / counts)
+    return np.where(np.isnan(units), means[zoning], units)
+
+
+def evaluate_batch(prepared, scenarios, first_id):
+    """Units by source, TIF, neighborhood and city for a batch of scenarios, as an arrow table."""
+    rezone = scenarios["rezone"].to_numpy()
+    columns = {"scenario_id": [], "source": [], "level": [], "name": [], "units": []}
+    for source, table in zip(SOURCES, prepared["tables"]):
+        prefix, defaults = ("lot", LOT_DEFAULTS) if source == "lots" else ("building", BUILDING_DEFAULTS)
+        params = capacity_scenarios(scenarios, prefix, defaults)
+        units = np.empty((len(table["zoning"]), len(scenarios)))
+        for selection in np.unique(rezone):
+            same = rezone == selection
+            units[:, same] = unit_capacity(**site_capacity(table, prepared["rules"], prepared["unit_area"], selection),
+                                           scenarios=params[same])
+        if source == "lots":
+            included = lot_eligibility(table, prepared["routes"], scenarios)
+            units = impute_by_zone(units, included, table["zoning"])
+        else:
+            included = np.ones(units.shape, dtype=bool)
+        units = np.where(included & ~np.isnan(units), units, 0.0)
+
+        for level in LEVELS:
+            names = prepared["names"][level]
+            codes = np.zeros(len(units), dtype=np.int64) if level == "city" else table[level]
+            totals = group_sum(units, codes, len(names))
+            columns["scenario_id"].append(np.repeat(np.arange(first_id, first_id + len(scenarios)), len(names)))
+            columns["source"].append(np.full(totals.size, SOURCES.index(source), dtype=np.int8))
+            columns["level"].append(np.full(totals.size, LEVELS.index(level), dtype=np.int8))
+            columns["name"].append(np.tile(np.arange(len(names), dtype=np.int32), len(scenarios)))
+            columns["units"].append(totals.T.ravel())
+
+    # one dictionary of names across levels, a TIF can share its name with a neighborhood
+    levels = np.concatenate(columns["level"])
+    names = np.concatenate(columns["name"])
+    dictionary, name_codes = np.unique(np.concatenate([prepared["names"][level] for level in LEVELS]).astype(str),
+                                       return_inverse=True)
+    offsets = np.cumsum([0] + [len(prepared["names"][level]) for level in LEVELS])[:-1]
+    return pa.table({"scenario_id": pa.array(np.concatenate(columns["scenario_id"]), pa.int32()),
+                     "source": pa.DictionaryArray.from_arrays(np.concatenate(columns["source"]), pa.array(SOURCES)),
+                     "level": pa.DictionaryArray.from_arrays(levels, pa.array(LEVELS)),
+                     "name": pa.DictionaryArray.from_arrays(name_codes[offsets[levels] + names].astype(np.int32),
+                                                            pa.array(dictionary)),
+                     "units": pa.array(np.concatenate(columns["units"]), pa.float64())})
+
+
+_prepared = None
+
+
+def init_worker(prepared_path):
+    """Load the prepared site tables once per worker process."""
+    global _prepared
+    with open(prepared_path, "rb") as f:
+        _prepared = pickle.load(f)
+
+
+def run_batch(scenarios, first_id):
+    return evaluate_batch(_prepared, scenarios, first_id)
+
+
+def run_sweep(scenarios, output_path=OUTPUT_PATH, workers=None, batch_size=250):
+    """Evaluate every scenario across a process pool, streaming results to parquet.
+
+    Scenario ids are row positions in `scenarios`, which are written next to the
+    results as <output>_scenarios.parquet. Returns the number of result rows.
+    """
+    scenarios = sweep_matrix(scenarios)
+    prepared_path = prepare_sites()
+    workers = workers or os.cpu_count()
+    batches = [(scenarios.iloc[start:start + batch_size], start)
+               for start in range(0, len(scenarios), batch_size)]
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    scenarios.rename_axis("scenario_id").reset_index().to_parquet(
+        os.path.splitext(output_path)[0] + "_scenarios.parquet", index=False)
+
+    tmp_path = output_path + f".{os.getpid()}.tmp"
+    writer = None
+    rows = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(prepared_path,)) as pool:
+        pending = set()
+        # keep a few batches per worker in flight so finished results don't pile up
+        for batch in batches:
+            pending.add(pool.submit(run_batch, *batch))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    table = future.result()
+                    writer = writer or pq.ParquetWriter(tmp_path, table.schema, compression="zstd")
+                    writer.write_table(table)
+                    rows += table.num_rows
+        for future in pending:
+            table = future.result()
+            writer = writer or pq.ParquetWriter(tmp_path, table.schema, compression="zstd")
+            writer.write_table(table)
+            rows += table.num_rows
+    if writer is not None:
+        writer.close()
+        os.replace(tmp_path, output_path)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Total units by TIF, neighborhood and source for many policy scenarios.")
+    parser.add_argument("scenarios", help="CSV or parquet file with one scenario per row, one column per lever")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="parquet file the results are written to")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=250, help="scenarios per batch")
+    args = parser.parse_args(argv)
+
+    if args.scenarios.endswith(".parquet"):
+        scenarios = pd.read_parquet(args.scenarios)
+    else:
+        scenarios = pd.read_csv(args.scenarios, dtype={"corridors": str, "rezone": str})
+    rows = run_sweep(scenarios, args.output, args.workers, args.batch_size)
+    print(f"{len(scenarios)} scenarios, {rows} rows written to {os.path.relpath(args.output, path)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
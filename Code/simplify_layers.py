@@ -0,0 +1,65 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from etod_eligibility import METRIC_CRS
+from layer_io import SIMPLIFIED_LAYERS, SIMPLIFY_ZOOMS, read_layer, simplified_name, write_layer
+
+# ground size of one screen pixel at zoom 0 at Chicago's latitude, in meters,
+# halving with every zoom level
+PIXEL_SIZE_Z0 = 156543.03 * np.cos(np.radians(41.88))
+
+
+def zoom_tolerance(zoom):
+    """Simplification tolerance (meters) for a map zoom, one screen pixel."""
+    return PIXEL_SIZE_Z0 / 2 ** zoom
+
+
+def shared_arcs(polygons):
+    """Polygon boundaries split into arcs running between the points where three or
+    more polygons meet. Neighboring polygons share one copy of their common edge."""
+    boundaries = shapely.boundary(polygons)
+    noded = shapely.union_all(boundaries)
+    return shapely.get_parts(shapely.line_merge(noded))
+
+
+def simplify_coverage(polygons, tolerance):
+    """Simplify polygons without opening gaps or overlaps between neighbors.
+
+    Every shared arc is simplified once with its end points fixed, so both sides of
+    an edge move together. The simplified arcs are polygonized back into faces and
+    each face goes to the original polygons containing it. Polygons that would
+    vanish are simplified on their own instead.
+    """
+    arcs = shapely.simplify(shared_arcs(polygons), tolerance, preserve_topology=True)
+    faces = shapely.get_parts(shapely.polygonize(shapely.get_parts(shapely.union_all(arcs))))
+    points = shapely.point_on_surface(faces)
+
+    tree = shapely.STRtree(polygons)
+    face_idx, polygon_idx = tree.query(points, predicate="within")
+    owned = pd.Series(faces[face_idx]).groupby(polygon_idx).agg(lambda parts: shapely.union_all(parts.to_numpy()))
+
+    result = shapely.simplify(polygons, tolerance, preserve_topology=True)
+    result[owned.index.to_numpy()] = owned.to_numpy()
+    return shapely.make_valid(result)
+
+
+def simplify_layer(gdf, zoom):
+    """Copy of a polygon layer simplified for a map zoom, in the layer's own CRS."""
+    metric = gdf.geometry.to_crs(METRIC_CRS)
+    simplified = simplify_coverage(metric.to_numpy(), zoom_tolerance(zoom))
+    out = gdf.copy()
+    out[gdf.geometry.name] = gpd.GeoSeries(simplified, index=gdf.index, crs=METRIC_CRS).to_crs(gdf.crs)
+    return out
+
+
+if __name__ == "__main__":
+    for name in SIMPLIFIED_LAYERS:
+        gdf = read_layer(name)
+        full_size = shapely.get_num_coordinates(gdf.geometry.to_numpy()).sum()
+        for zoom in SIMPLIFY_ZOOMS:
+            simplified = simplify_layer(gdf, zoom)
+            write_layer(simplified, simplified_name(name, zoom))
+            size = shapely.get_num_coordinates(simplified.geometry.to_numpy()).sum()
+            print(f"{name} z{zoom}: {size:,} of {full_size:,} vertices")
@@ -0,0 +1,193 @@
+import ast
+import hashlib
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from cache_utils import dataset_digest, load_json, save_json
+from etod_eligibility import METRIC_CRS
+from geometry_io import read_wkt_csv
+from layer_io import PROCESSED_DIR, layer_path, read_layer, write_layer
+
+path = os.getcwd()
+
+# layers making up the transit network, and the manifest recording their content hash
+NETWORK_LAYERS = ["rail_lines", "bus_network", "transit_stops"]
+MANIFEST_PATH = os.path.join(PROCESSED_DIR, "transit_network.json")
+
+# a noded piece of linework belongs to every source line within this many meters
+TAG_TOLERANCE = 0.1
+
+# 'L' lines served by each stop, from the stop list's line flags
+L_LINE_FLAGS = {"RED": "Red", "BLUE": "Blue", "G": "Green", "BRN": "Brown", "P": "Purple",
+                "Pexp": "Purple (Express)", "Y": "Yellow", "Pnk": "Pink", "O": "Orange"}
+
+
+def split_tags(values):
+    """Comma separated line or route names as sets."""
+    return [set(t.strip() for t in str(v).split(",") if t.strip()) if pd.notna(v) else set() for v in values]
+
+
+def tagged_linework(lines, tags):
+    """Deduplicated, noded linework with the tags of every source line it runs along.
+
+    The source lines are noded into pieces that only meet at their ends, so a stretch
+    of track shared by several lines is kept once. Each piece gets the union of the
+    tags of the lines lying on it, and pieces with the same tags are merged back into
+    lines. Returns the merged lines and their tag sets.
+    """
+    pieces = shapely.get_parts(shapely.union_all(lines))
+    # a piece lies along every source line it came from. a line crossing the piece can
+    # only pass near one of three points along it
+    points = [gpd.GeoSeries(shapely.line_interpolate_point(pieces, f, normalized=True), crs=4326)
+              .to_crs(METRIC_CRS).to_numpy() for f in (0.25, 0.5, 0.75)]
+    metric_lines = gpd.GeoSeries(lines, crs=4326).to_crs(METRIC_CRS).to_numpy()
+    piece_idx, line_idx = shapely.STRtree(metric_lines).query(points[1], predicate="dwithin",
+                                                              distance=TAG_TOLERANCE)
+    along = shapely.dwithin(points[0][piece_idx], metric_lines[line_idx], TAG_TOLERANCE) & \
+        shapely.dwithin(points[2][piece_idx], metric_lines[line_idx], TAG_TOLERANCE)
+    piece_idx, line_idx = piece_idx[along], line_idx[along]
+    piece_tags = [set() for _ in pieces]
+    for piece, line in zip(piece_idx, line_idx):
+        piece_tags[piece] |= tags[line]
+    labels = pd.Series([tuple(sorted(t)) for t in piece_tags])
+
+    merged, merged_tags = [], []
+    for label, group in labels.groupby(labels, sort=True):
+        parts = shapely.get_parts(shapely.line_merge(shapely.multilinestrings(pieces[group.index.to_numpy()])))
+        merged.extend(parts)
+        merged_tags.extend([set(label)] * len(parts))
+    return np.array(merged, dtype=object), merged_tags
+
+
+def rail_network(l_lines_gdf, metra_lines_gdf, neighborhood_gdf):
+    """'L' and Metra (clipped to Chicago) track as deduplicated lines, tagged with the
+    modes and lines running on them."""
+    metra_chi_gdf = gpd.clip(metra_lines_gdf.to_crs(epsg=4326), neighborhood_gdf)
+    lines = np.concatenate([l_lines_gdf.geometry.to_numpy(), metra_chi_gdf.geometry.to_numpy()])
+    # tags are "<mode>: <line>"
+    tags = [{f"L: {line}" for line in names} or {"L: "} for names in split_tags(l_lines_gdf["LINES"])] + \
+           [{f"Metra: {line}" for line in names} or {"Metra: "} for names in split_tags(metra_chi_gdf["LINES"])]
+
+    geometry, tags = tagged_linework(lines, tags)
+    modes = [", ".join(sorted({t.split(": ")[0] for t in tag})) for tag in tags]
+    served = [", ".join(sorted(t for t in tag if not t.endswith(": "))) for tag in tags]
+    return gpd.GeoDataFrame({"line_id": np.arange(len(geometry)), "mode": modes, "lines": served},
+                            geometry=geometry, crs=4326)
+
+
+def bus_network(bus_routes_gdf):
+    """Bus routes as deduplicated lines tagged with the routes running on them."""
+    geometry, routes = tagged_linework(bus_routes_gdf.geometry.to_numpy(),
+                                       split_tags(bus_routes_gdf["route"].astype(str)))
+    return gpd.GeoDataFrame({"routes": [", ".join(sorted(r)) for r in routes]}, geometry=geometry, crs=4326)
+
+
+def transit_stops(l_stops, metra_stops_gdf, rail_gdf):
+    """'L' and Chicago Metra stops with the rail line each one sits on and how far away."""
+    location = l_stops["Location"].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+    l_stops_gdf = gpd.GeoDataFrame(
+        {"station_name": l_stops["STATION_DESCRIPTIVE_NAME"],
+         "stop_id": l_stops["STOP_ID"],
+         "mode": "L",
+         "stop_lines": l_stops[list(L_LINE_FLAGS)].apply(
+             lambda row: ", ".join(name for flag, name in L_LINE_FLAGS.items() if row[flag]), axis=1)},
+        geometry=gpd.points_from_xy(location.str[1], location.str[0]), crs=4326)
+
+    metra_stops_gdf = metra_stops_gdf.to_crs(epsg=4326)
+    metra_stops_gdf = metra_stops_gdf.loc[metra_stops_gdf["MUNICIPALI"] == "Chicago"]
+    metra_stops_gdf = gpd.GeoDataFrame({"station_name": metra_stops_gdf["NAME"],
+                                        "stop_id": metra_stops_gdf["STATION_ID"],
+                                        "mode": "Metra",
+                                        "stop_lines": metra_stops_gdf["LINES"]},
+                                       geometry=metra_stops_gdf.geometry)
+    stops = pd.concat([l_stops_gdf, metra_stops_gdf], ignore_index=True)
+    stops["stop_id"] = stops["stop_id"].astype("Int64")
+
+    # stop to line topology: the nearest piece of track of the stop's own mode
+    stop_points = stops.geometry.to_crs(METRIC_CRS).to_numpy()
+    rail = rail_gdf.geometry.to_crs(METRIC_CRS).to_numpy()
+    stops["line_id"] = -1
+    stops["line_dist_m"] = np.nan
+    for mode in ("L", "Metra"):
+        stop_idx = np.flatnonzero(stops["mode"] == mode)
+        rail_idx = np.flatnonzero(rail_gdf["mode"].str.contains(mode, regex=False))
+        if len(stop_idx) == 0 or len(rail_idx) == 0:
+            continue
+        found, nearest = shapely.STRtree(rail[rail_idx]).query_nearest(stop_points[stop_idx], all_matches=False)
+        stops.loc[stop_idx[found], "line_id"] = rail_gdf["line_id"].to_numpy()[rail_idx[nearest]]
+        stops.loc[stop_idx[found], "line_dist_m"] = shapely.distance(stop_points[stop_idx[found]],
+                                                                     rail[rail_idx[nearest]]).round(1)
+    return stops
+
+
+def content_hash(layers):
+    """sha256 of the network's attributes and geometry, independent of the file format."""
+    digest = hashlib.sha256()
+    for name in NETWORK_LAYERS:
+        gdf = layers[name]
+        digest.update(name.encode())
+        digest.update(gdf.drop(columns=gdf.geometry.name).to_csv(index=False).encode())
+        digest.update(b"".join(shapely.to_wkb(gdf.geometry.to_numpy())))
+    return digest.hexdigest()
+
+
+def build_transit_network():
+    l_lines_gdf = read_wkt_csv(os.path.join(path, "Data/Raw/CTA_l_lines.csv"), geometry_name="the_geom")
+    metra_lines_gdf = gpd.read_file(os.path.join(path, "Data/Raw/MetraLinesshp.shp"))
+    neighborhood_gdf = read_wkt_csv(os.path.join(path, "Data/Raw/Neighborhoods.csv"))
+    bus_routes_gdf = gpd.read_file(os.path.join(path, "Data/Raw/bus_routes.shp")).set_crs(epsg=4326,
+                                                                                         allow_override=True)
+    l_stops = pd.read_csv(os.path.join(path, "Data/Raw/CTA_System_Information_List_of_L_Stops.csv"))
+    metra_stops_gdf = gpd.read_file(os.path.join(path, "Data/Raw/MetraStations.shp"))
+
+    rail_gdf = rail_network(l_lines_gdf, metra_lines_gdf, neighborhood_gdf)
+    return {"rail_lines": rail_gdf,
+            "bus_network": bus_network(bus_routes_gdf),
+            "transit_stops": transit_stops(l_stops, metra_stops_gdf, rail_gdf)}
+
+
+def write_transit_network(layers):
+    """Write the network layers and a manifest with their content hash and file digests."""
+    for name in NETWORK_LAYERS:
+        write_layer(layers[name], name)
+    save_json({"content_hash": content_hash(layers),
+               "files": {name: dataset_digest(layer_path(name)) for name in NETWORK_LAYERS}},
+              MANIFEST_PATH)
+
+
+def network_hash():
+    """Content hash of the transit network last written, checked against its files."""
+    manifest = load_json(MANIFEST_PATH)
+    if not manifest:
+        raise FileNotFoundError(f"{MANIFEST_PATH} not found, run python Code/transit_network.py")
+    for name, digest in manifest["files"].items():
+        if dataset_digest(layer_path(name)) != digest:
+            raise ValueError(f"{name} changed since the transit network was built, "
+                             "run python Code/transit_network.py")
+    return manifest["content_hash"]
+
+
+def read_transit_network():
+    """The network layers, after checking they are the ones the manifest describes."""
+    network_hash()
+    return {name: read_layer(name) for name in NETWORK_LAYERS}
+
+
+def route_lines(bus_gdf, routes=None):
+    """One row per bus route and piece of linework it runs on, optionally only `routes`."""
+    lines = bus_gdf.assign(route=bus_gdf["routes"].str.split(", ")).explode("route", ignore_index=True)
+    if routes is not None:
+        lines = lines.loc[lines["route"].isin(routes)]
+    return lines[["route", lines.geometry.name]]
+
+
+if __name__ == "__main__":
+    network = build_transit_network()
+    write_transit_network(network)
+    for name in NETWORK_LAYERS:
+        print(f"{name}: {len(network[name]):,} rows")
+    print(f"content hash {network_hash()[:16]}")
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# zone categories where the ground floor is assumed to stay commercial
+COMMERCIAL_CATEGORIES = ["B-Business", "C-Commercial"]
+
+# units needed to meet Chicago's affordable housing shortfall
+TARGET_UNITS = 126_125
+
+# scenario parameters
+#   rentable_factor        share of the site sq ft usable for units
+#   far_scale              multiplier on the FAR of the (re-zoned) class
+#   commercial_share       share of the FAR sq ft kept for units in B/C zones
+#   ground_floor_deduction rentable floors taken off for commercial use in B/C zones
+#   min_unit_size          average unit size, unless the min lot area per unit is larger
+#   rezoned_sfh_cap        max units on single family sites re-zoned to RT-4
+#   single_family_units    units on sites that stay single family (NaN to leave as calculated)
+LOT_DEFAULTS = {"rentable_factor": 0.8,
+                "far_scale": 1.0,
+                "commercial_share": 1.0,
+                "ground_floor_deduction": 1.0,
+                "min_unit_size": 720.0,
+                "rezoned_sfh_cap": np.inf,
+                "single_family_units": np.nan}
+
+BUILDING_DEFAULTS = {"rentable_factor": 1.0,
+                     "far_scale": 1.0,
+                     "commercial_share": 0.75,
+                     "ground_floor_deduction": 0.0,
+                     "min_unit_size": 720.0,
+                     "rezoned_sfh_cap": 4.0,
+                     "single_family_units": 1.0}
+
+
+def scenario_matrix(defaults, scenarios=None):
+    """One row per scenario with every parameter, missing ones taken from `defaults`.
+
+    `scenarios` is anything pd.DataFrame accepts (a frame, a dict of lists, a list
+    of dicts). Parameters left out, or left blank (NaN) for a scenario, get their
+    default. With no scenarios the defaults are the only scenario.
+    """
+    if scenarios is None:
+        return pd.DataFrame([defaults])
+    scenarios = pd.DataFrame(scenarios).reset_index(drop=True)
+    unknown = set(scenarios.columns) - set(defaults)
+    if unknown:
+        raise ValueError(f"unknown scenario parameters: {sorted(unknown)}")
+    for name, value in defaults.items():
+        scenarios[name] = scenarios[name].fillna(value) if name in scenarios else value
+    return scenarios[list(defaults)]
+
+
+def site_arrays(df, sq_ft_column, far_applies=True):
+    """Site attributes unit_capacity needs, from a frame with the zoning rule columns."""
+    return {"sq_ft": df[sq_ft_column],
+            "far": df["FAR"],
+            "lot_area_per_unit": df["lot_area_per_unit"],
+            "commercial": df["re_zone_cat"].isin(COMMERCIAL_CATEGORIES),
+            "far_applies": far_applies,
+            "rezoned_sfh": (df["sfh_flag"] == 1) & (df["re_zone"] != df["zoning"]),
+            "single_family": df["re_zone"].str.startswith("RS-").fillna(False).astype(bool)}
+
+
+def unit_capacity(sq_ft, far, lot_area_per_unit, commercial, scenarios,
+                  far_applies=True, rezoned_sfh=False, single_family=False):
+    """Units that can be built on each site under each scenario, shape (sites, scenarios).
+
+    Site attributes are 1-d arrays (or scalars), `scenarios` is a frame from
+    scenario_matrix. Every scenario is evaluated at once by broadcasting sites
+    against scenarios. Sites whose residential sq ft is smaller than the unit size
+    get 0 units, sites missing sq ft or FAR get NaN.
+    """
+    def site(values, dtype=float):
+        return np.asarray(values, dtype=dtype).reshape(-1, 1)
+
+    param = {name: scenarios[name].to_numpy(dtype=float).reshape(1, -1) for name in LOT_DEFAULTS}
+
+    rentable = site(sq_ft) * param["rentable_factor"]
+    far_area = np.where(site(far_applies, bool), rentable * site(far) * param["far_scale"], rentable)
+    residential = np.where(site(commercial, bool),
+                           far_area * param["commercial_share"] - rentable * param["ground_floor_deduction"],
+                           far_area)
+
+    unit_size = np.fmax(site(lot_area_per_unit), param["min_unit_size"])
+    with np.errstate(invalid="ignore"):
+        units = np.where(unit_size > residential, 0, np.floor(residential / unit_size))
+        units = np.where(site(rezoned_sfh, bool) & (units > param["rezoned_sfh_cap"]),
+                         param["rezoned_sfh_cap"], units)
+    sfh_units = np.broadcast_to(param["single_family_units"], units.shape)
+    return np.where(site(single_family, bool) & ~np.isnan(sfh_units), sfh_units, units)
+
+
+def total_units(units):
+    """Total units per scenario, ignoring sites with unknown capacity."""
+    return np.nansum(units, axis=0)
@@ -0,0 +1,130 @@
+import argparse
+import gzip
+import os
+import sqlite3
+from collections import defaultdict
+
+import mapbox_vector_tile
+import mercantile
+import numpy as np
+import pandas as pd
+import shapely
+
+from layer_io import DASHBOARD_LAYERS, PROCESSED_DIR, read_layer
+
+path = os.getcwd()
+
+TILE_DIR = os.path.join(PROCESSED_DIR, "tiles")
+
+# Chicago fills a z10 tile, z16 is about a block
+MIN_ZOOM = 10
+MAX_ZOOM = 16
+
+# tile coordinates run from 0 to EXTENT, features are clipped BUFFER units outside
+# the tile so lines and polygon edges don't show seams
+EXTENT = 4096
+BUFFER = 64
+
+# half the width of the web mercator world, in meters
+ORIGIN_SHIFT = 20037508.342789244
+
+
+def tile_path(name, folder=TILE_DIR):
+    return os.path.join(folder, name + ".mbtiles")
+
+
+def tile_bounds(tile):
+    """Web mercator bounds of a tile."""
+    size = 2 * ORIGIN_SHIFT / 2 ** tile.z
+    minx = -ORIGIN_SHIFT + tile.x * size
+    maxy = ORIGIN_SHIFT - tile.y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def feature_properties(df):
+    """Property dicts of every row, without missing values (MVT has no null)."""
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    return [{k: v for k, v in record.items() if v is not None} for record in records]
+
+
+def features_by_tile(bounds_4326, zoom):
+    """Feature positions in each tile they touch at a zoom level."""
+    tiles = defaultdict(list)
+    for i, (west, south, east, north) in enumerate(bounds_4326):
+        if np.isnan(west):
+            continue
+        for tile in mercantile.tiles(west, south, east, north, zoom):
+            tiles[tile].append(i)
+    return tiles
+
+
+def encode_tile(name, tile, geometries, properties):
+    """One gzipped MVT tile of a layer, from its web mercator geometries."""
+    minx, miny, maxx, maxy = tile_bounds(tile)
+    scale = EXTENT / (maxx - minx)
+    pad = BUFFER / scale
+    clipped = shapely.clip_by_rect(geometries, minx - pad, miny - pad, maxx + pad, maxy + pad)
+    # simplify to a tile pixel, finer detail isn't visible at this zoom
+    clipped = shapely.simplify(clipped, 1 / scale, preserve_topology=True)
+    local = shapely.transform(clipped, lambda c: np.round((c - [minx, miny]) * scale))
+
+    features = [{"geometry": geom, "properties": props}
+                for geom, props in zip(local, properties) if not geom.is_empty]
+    if not features:
+        return None
+    data = mapbox_vector_tile.encode([{"name": name, "features": features}],
+                                     default_options={"extents": EXTENT, "quantize_bounds": None})
+    return gzip.compress(data)
+
+
+def write_mbtiles(gdf, name, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, folder=TILE_DIR):
+    """Write a layer as an MBTiles pyramid of gzipped Mapbox Vector Tiles.
+
+    Every tile holds one MVT layer named after the layer with all of its columns as
+    properties. The file is written next to its final path and moved into place.
+    """
+    os.makedirs(folder, exist_ok=True)
+    gdf = gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty)]
+    geometries = gdf.geometry.to_crs(epsg=3857).to_numpy()
+    bounds_4326 = gdf.geometry.to_crs(epsg=4326).bounds.to_numpy()
+    properties = feature_properties(pd.DataFrame(gdf.drop(columns=gdf.geometry.name)))
+
+    out_path = tile_path(name, folder)
+    tmp_path = out_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    con.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+    con.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+    west, south = np.nanmin(bounds_4326[:, :2], axis=0)
+    east, north = np.nanmax(bounds_4326[:, 2:], axis=0)
+    con.executemany("INSERT INTO metadata VALUES (?, ?)",
+                    [("name", name), ("format", "pbf"), ("type", "overlay"),
+                     ("minzoom", str(min_zoom)), ("maxzoom", str(max_zoom)),
+                     ("bounds", f"{west},{south},{east},{north}")])
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        rows = []
+        for tile, positions in features_by_tile(bounds_4326, zoom).items():
+            data = encode_tile(name, tile, geometries[positions], [properties[i] for i in positions])
+            if data is not None:
+                # MBTiles rows count from the bottom (TMS)
+                rows.append((zoom, tile.x, 2 ** zoom - 1 - tile.y, data))
+        con.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", rows)
+    con.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+    con.commit()
+    con.close()
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write vector tile pyramids of the dashboard layers.")
+    parser.add_argument("layers", nargs="*", help="only these layers (default: every dashboard layer)")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    args = parser.parse_args()
+
+    for name in args.layers or DASHBOARD_LAYERS:
+        out_path = write_mbtiles(read_layer(name), name, args.min_zoom, args.max_zoom)
+        print(f"{name}: {os.path.getsize(out_path) / 1e6:.1f} MB")
@@ -0,0 +1,58 @@
+import os
+import pickle
+import numpy as np
+import shapely
+
+from cache_utils import CACHE_DIR, file_digest
+from geometry_io import read_wkt_csv
+
+path = os.getcwd()
+
+ZONING_CSV = os.path.join(path, "Data/Raw/Boundaries_-_Zoning_Districts__current__20250404.csv")
+ZONING_CACHE_DIR = os.path.join(CACHE_DIR, "zoning")
+
+
+def build_zoning_index(zones_gdf):
+    """STRtree over prepared zoning district polygons plus their ZONE_CLASS values."""
+    geometries = zones_gdf.geometry.to_crs(epsg=4326).to_numpy()
+    shapely.prepare(geometries)
+    return {"tree": shapely.STRtree(geometries),
+            "zone_class": zones_gdf["ZONE_CLASS"].to_numpy(dtype=object)}
+
+
+def load_zoning_index(csv_path=ZONING_CSV):
+    """Load the serialized zoning index, building it only when the zoning file changed."""
+    digest = file_digest(csv_path)
+    cache_path = os.path.join(ZONING_CACHE_DIR, f"zoning_index-{digest[:16]}.pkl")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+
+    index = build_zoning_index(read_wkt_csv(csv_path))
+    os.makedirs(ZONING_CACHE_DIR, exist_ok=True)
+    tmp_path = cache_path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return index
+
+
+def classify_points(index, points):
+    """ZONE_CLASS of the zoning district each point falls within, in bulk.
+
+    `points` is any array of shapely points in EPSG:4326 (e.g. a GeoSeries).
+    Points outside every district get NaN. Where districts overlap, the first
+    district in the zoning file wins.
+    """
+    if getattr(points, "crs", None) is not None:
+        points = points.to_crs(epsg=4326)
+    points = np.asarray(points)
+    point_idx, zone_idx = index["tree"].query(points, predicate="within")
+    # keep the first matching district for each point
+    order = np.lexsort((zone_idx, point_idx))
+    point_idx, zone_idx = point_idx[order], zone_idx[order]
+    first = np.unique(point_idx, return_index=True)[1]
+
+    zone_class = np.full(len(points), np.nan, dtype=object)
+    zone_class[point_idx[first]] = index["zone_class"][zone_idx[first]]
+    return zone_class
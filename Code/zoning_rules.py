@@ -0,0 +1,100 @@
+import os
+import numpy as np
+import pandas as pd
+
+path = os.getcwd()
+
+RULES_PATH = os.path.join(path, "Data/Raw/zoning_policy_rules.csv")
+UNIT_AREA_PATH = os.path.join(path, "Data/Raw/zone min unit area.csv")
+
+# columns added by apply_zoning_rules
+RULE_COLUMNS = ["excluded", "sfh_flag", "zone_cat", "re_zone", "re_zone_cat",
+                "lot_area_per_unit", "FAR", "impute_sqft"]
+
+
+def load_rules(rules_path=RULES_PATH):
+    """Policy rules table with columns rule, match, pattern and value.
+
+    rule is one of
+      exclude      zones that cannot have residential units built
+      sfh          single family zones
+      category     broader zone category (value), first matching rule wins
+      rezone       proposed re-zoning (value), first matching rule wins
+      far_override FAR (value) for the re-zoned class, e.g. Connected Communities
+      impute_sqft  sq ft (value) assumed for buildings missing sq ft
+    match is prefix, contains or exact and is tested against pattern.
+    """
+    return pd.read_csv(rules_path, dtype=str, keep_default_na=False)
+
+
+def rule_matches(classes, match, pattern):
+    if match == "prefix":
+        return classes.str.startswith(pattern)
+    if match == "contains":
+        return classes.str.contains(pattern, regex=False)
+    if match == "exact":
+        return classes == pattern
+    raise ValueError(f"unknown match type '{match}' in zoning policy rules")
+
+
+def first_match(classes, rules, rule):
+    """Value of the first rule of a kind matching each class, NaN where none match."""
+    result = pd.Series(np.nan, index=classes.index, dtype=object)
+    for row in rules.loc[rules["rule"] == rule].itertuples():
+        hit = result.isna() & rule_matches(classes, row.match, row.pattern)
+        result[hit] = row.value
+    return result
+
+
+def any_match(classes, rules, rule):
+    hit = pd.Series(False, index=classes.index)
+    for row in rules.loc[rules["rule"] == rule].itertuples():
+        hit |= rule_matches(classes, row.match, row.pattern)
+    return hit
+
+
+def compile_rules(zone_classes, rules, unit_area):
+    """Lookup table of every rule outcome for each distinct zone class.
+
+    Rules are only evaluated once per distinct class, the result is gathered onto
+    rows by apply_zoning_rules.
+    """
+    classes = pd.Series(zone_classes, dtype=object)
+    table = pd.DataFrame(index=classes.index)
+    table["excluded"] = any_match(classes, rules, "exclude")
+    table["sfh_flag"] = any_match(classes, rules, "sfh").astype(int)
+    table["zone_cat"] = first_match(classes, rules, "category").fillna("Unknown")
+    table["re_zone"] = first_match(classes, rules, "rezone").fillna(classes)
+    table["re_zone_cat"] = first_match(table["re_zone"], rules, "category").fillna("Unknown")
+
+    unit_area = unit_area.drop_duplicates(subset=["zoning"]).set_index("zoning")
+    table["lot_area_per_unit"] = unit_area["lot_area_per_unit"].reindex(table["re_zone"]).to_numpy()
+    table["FAR"] = pd.to_numeric(first_match(table["re_zone"], rules, "far_override")).fillna(
+        pd.Series(unit_area["FAR"].reindex(table["re_zone"]).to_numpy(), index=table.index))
+    table["impute_sqft"] = pd.to_numeric(first_match(classes, rules, "impute_sqft"))
+    return table
+
+
+def apply_zoning_rules(df, zoning_col, rules=None, unit_area=None):
+    """Add every zoning policy rule outcome to a frame in one pass.
+
+    Adds excluded, sfh_flag, zone_cat, re_zone (the re-zoned class), re_zone_cat,
+    lot_area_per_unit and FAR (for the re-zoned class) and impute_sqft. Rows
+    without a zone class are excluded.
+    """
+    rules = load_rules() if rules is None else rules
+    unit_area = pd.read_csv(UNIT_AREA_PATH) if unit_area is None else unit_area
+
+    codes, classes = pd.factorize(df[zoning_col])
+    table = compile_rules(classes, rules, unit_area)
+    # rows without a zone class point at an extra, excluded row
+    missing = pd.DataFrame({"excluded": [True], "sfh_flag": [0]}, index=[len(table)])
+    table = pd.concat([table, missing])
+    table["excluded"] = table["excluded"].astype(bool)
+    table["sfh_flag"] = table["sfh_flag"].astype(int)
+    codes = np.where(codes < 0, len(classes), codes)
+
+    df = df.copy()
+    for col in RULE_COLUMNS:
+        df[col] = table[col].to_numpy()[codes]
+    return df
@@ -1,5 +1,5 @@
 import geopandas as gpd
-from shiny import App, ui, render, reactive
+from shiny import App, ui, render, reactive, req
 import os
 import folium
 import matplotlib.pyplot as plt
@@ -8,15 +8,282 @@ import branca
 from branca.element import Element
 import pandas as pd
 
-path = os.getcwd()
-
-tif_districts_gdf = gpd.read_file(os.path.join(path, "Data/Processed/tif_districts.shp"))
-rail_lines_gdf = gpd.read_file(os.path.join(path, "Data/Processed/rail_lines.shp"))
-etod_lots_tifs = gpd.read_file(os.path.join(path, "Data/Processed/etod_lots_tifs.shp"))
-bus_routes_gdf = gpd.read_file(os.path.join(path, "Data/Processed/bus_routes.shp"))
-sale_buildings_gdf = gpd.read_file(os.path.join(path, "Data/Processed/sale_buildings.shp"))
-vacant_buildings_gdf = gpd.read_file(os.path.join(path, "Data/Processed/vacant_buildings.shp"))
-merged_neighborhoods_gdf = gpd.read_file(os.path.join(path, "Data/Processed/neighborhood_level.shp"))
+from functools import lru_cache
+
+from layers import read_layer, read_layer_for_zoom
+from shared_layers import open_layer
+from filter_index import FilterIndex
+import metrics
+from map_layers import LayerRegistry, Overlay, PointLayer, VectorTileLayer
+from render_cache import RenderCache, warm_up_count
+from site_export import EXPORT_FORMATS, stream_rows
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
+from tile_server import available_tilesets, tile_app
+
+# only load the columns the maps use
+building_columns = ["Neigh", "zone_cat", "zoning", "re_zone", "Address", "n_units"]
+
+# zoom of the citywide and the TIF / neighborhood maps, polygons are read simplified
+# for the zoom they are shown at
+overview_zoom = 11
+detail_zoom = 14
+
+tif_districts_gdf = read_layer_for_zoom("tif_districts", overview_zoom, columns=["TIF_name"])
+tif_detail_gdf = read_layer_for_zoom("tif_districts", detail_zoom, columns=["TIF_name"])
+rail_lines_gdf = read_layer("rail_lines", columns=[])
+# the point layers are memory mapped when KIHC_SHARED_LAYERS=1, so several workers
+# serving the app share one copy of them
+etod_lots_tifs = open_layer("etod_lots_tifs", columns=["TIF_name", "zone_cat", "zoning", "re_zone", "Address", "n_units"])
+bus_routes_gdf = read_layer("bus_routes", columns=[])
+sale_buildings_gdf = open_layer("sale_buildings", columns=building_columns)
+vacant_buildings_gdf = open_layer("vacant_buildings", columns=building_columns)
+merged_neighborhoods_gdf = read_layer_for_zoom("neighborhood_level", overview_zoom,
+                                              columns=["Neigh", "percent_change"])
+
+# row positions per TIF / neighborhood (and zone category bitmasks), so the maps
+# and dropdowns never scan the full layers
+tif_index = FilterIndex(tif_detail_gdf, "TIF_name")
+lots_index = FilterIndex(etod_lots_tifs, "TIF_name", category="zone_cat")
+neighborhood_index = FilterIndex(merged_neighborhoods_gdf, "Neigh")
+sale_index = FilterIndex(sale_buildings_gdf, "Neigh", category="zone_cat")
+vacant_index = FilterIndex(vacant_buildings_gdf, "Neigh", category="zone_cat")
+
+# static overlays are projected, rounded and serialized once, renders only reference them
+merged_neighborhoods_gdf["percent_change"] = merged_neighborhoods_gdf["percent_change"].round(2)
+colormap = branca.colormap.linear.RdPu_09.scale(merged_neighborhoods_gdf["percent_change"].min(),
+                                                merged_neighborhoods_gdf["percent_change"].max())
+colormap.caption = "Percent Change in Avg. Assessed Value, 2000-2023"
+
+tif_style = {"color": "purple", "weight": 1, "fillOpacity": 0.6}
+rail_style = {"color": "limegreen", "weight": 2, "fillOpacity": 0.8}
+bus_style = {"color": "darkgreen", "weight": 2, "fillOpacity": 0.8}
+neighborhood_style = {"weight": 1, "fillOpacity": 0.6, "color": "black"}
+lot_point_style = {"radius": 3, "color": "skyblue", "fill": True, "fillColor": "skyblue", "fillOpacity": 0.5}
+vacant_point_style = {"radius": 2, "color": "green", "fill": True, "fillColor": "green", "fillOpacity": 0.9}
+sale_point_style = {"radius": 2, "color": "black", "fill": True, "fillColor": "black", "fillOpacity": 0.9}
+
+tif_overlay = Overlay(tif_districts_gdf, tif_style,
+                      tooltip_fields=["TIF_name"], tooltip_aliases=["TIF District:"])
+rail_overlay = Overlay(rail_lines_gdf, rail_style)
+bus_overlay = Overlay(bus_routes_gdf, bus_style)
+neighborhood_overlay = Overlay(
+    merged_neighborhoods_gdf.assign(percent_change_label=merged_neighborhoods_gdf["percent_change"].map("{:,}".format)),
+    neighborhood_style,
+    tooltip_fields=["Neigh", "percent_change_label"],
+    tooltip_aliases=["Neighborhood", "Percent Change"],
+    feature_style=merged_neighborhoods_gdf["percent_change"].map(lambda x: {"fillColor": colormap(x)}))
+
+# with KIHC_VECTOR_TILES=1 and the tiles written by Code/vector_tiles.py, the citywide
+# maps draw their layers from the app's own /tiles endpoint, so the browser only loads
+# the tiles in view instead of every feature
+tiled_layers = {"tif_districts", "rail_lines", "bus_routes", "etod_lots_tifs",
+                "neighborhood_level", "vacant_buildings", "sale_buildings"}
+use_vector_tiles = os.environ.get("KIHC_VECTOR_TILES") == "1" and tiled_layers <= available_tilesets()
+neighborhood_fill = {name: {"fillColor": colormap(x)} for name, x in
+                     zip(merged_neighborhoods_gdf["Neigh"], merged_neighborhoods_gdf["percent_change"])}
+
+# hover text of the lots and buildings on the detail maps
+lot_tooltip_fields = ["zoning", "re_zone", "Address", "n_units"]
+lot_tooltip_aliases = ["Zoning:", "Proposed re-zoning:", "Address:", "Estimated # Units:"]
+building_tooltip_fields = ["zoning", "re_zone", "Address", "n_units"]
+building_tooltip_aliases = ["Zoning:", "Proposed re-zoning:", "Address:", "Number of Units:"]
+
+# layer checkboxes and the key each layer is registered under in the maps
+lot_layer_keys = {"TIF Districts": "tif",
+                  "Metra and CTA 'L' Lines": "rail",
+                  "ETOD Eligible Bus Corridors": "bus",
+                  "ETOD Eligible City-Owned Land": "lots"}
+building_layer_keys = {"Vacant Buildings": "vacant",
+                       "Buildings for Sale": "sale"}
+
+# checkbox choices, all selected by default
+layer_choices = list(lot_layer_keys)
+building_choices = list(building_layer_keys)
+zone_choices = ["B-Business",
+                "C-Commercial",
+                "D-Downtown",
+                "PD-Planned Development",
+                "R-Residential"]
+
+
+def layer_visibility(selected, keys):
+    return {key: label in selected for label, key in keys.items()}
+
+
+@lru_cache(maxsize=None)
+def selected_tif_overlay(tif_name):
+    """Overlay of a single TIF district, serialized the first time it is selected."""
+    tif_df = tif_index.take(tif_name)
+    return Overlay(tif_df, {"color": "purple", "weight": 1, "fillOpacity": 0.5})
+
+
+def tif_map_html(tif_name, layers, zones, timer):
+    """Detail map of one TIF district and its lots, as HTML, with its phases marked on `timer`."""
+    tif_df = tif_index.take(tif_name)
+    lots_df = lots_index.take(tif_name)
+    timer.mark("filter")
+
+    # If there's a selected TIF, update map center to its centroid
+    if not tif_df.empty:
+        centroid = tif_df.geometry.centroid.unary_union
+        map_center = [centroid.y, centroid.x]
+
+    # Initialize Folium map centered at the TIF district
+    map_ = folium.Map(location=map_center, zoom_start=detail_zoom, tiles = "CartoDB positron")
+
+    # Add layers based on user selection
+    selected_tif_overlay(tif_name).layer(show="TIF Districts" in layers, key="tif").add_to(map_)
+    rail_overlay.layer(show="Metra and CTA 'L' Lines" in layers, key="rail").add_to(map_)
+    bus_overlay.layer(show="ETOD Eligible Bus Corridors" in layers, key="bus").add_to(map_)
+
+    # Add ETOD Eligible City-Owned Land with Tooltips, all zones when none are selected
+    PointLayer(lots_df, marker="pin", color="blue",
+               tooltip_fields=lot_tooltip_fields, tooltip_aliases=lot_tooltip_aliases,
+               popup=True, show="ETOD Eligible City-Owned Land" in layers, key="lots",
+               category_field="zone_cat", categories=zones or None).add_to(map_)
+    LayerRegistry().add_to(map_)
+
+    # Define Legend as Raw HTML (Works 100%)
+    legend_html = """
+    <div style="
+        position: fixed;
+        bottom: 40px; left: 20px; width: 200px; height: auto;
+        background-color: white; z-index:9999; font-size:14px;
+        padding: 10px; border-radius: 8px; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);
+    ">
+        <b>Legend</b><br>
+        <i style="background: purple; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> TIF Districts <br>
+        <i style="background: limegreen; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> Metra and CTA 'L' Lines <br>
+        <i style="background: darkgreen; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> ETOD Eligible Bus Corridors <br>
+        <i style="background: skyblue; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> ETOD Eligible Land <br>
+    </div>
+    """
+
+    # 🔹 Use `Element` instead of MacroElement
+    legend = Element(legend_html)
+    map_.get_root().html.add_child(legend)
+    timer.mark("build")
+
+    # Return the HTML representation of the map
+    map_html = map_._repr_html_()
+    timer.mark("serialize")
+    return map_html
+
+
+def neighborhood_map_html(neighborhood, buildings, zones, timer):
+    """Detail map of the vacant and for sale buildings in one neighborhood, as HTML, with
+    its phases marked on `timer`."""
+    neigh_df = neighborhood_index.take(neighborhood)
+    sales_df = sale_index.take(neighborhood)
+    vacant_df = vacant_index.take(neighborhood)
+    timer.mark("filter")
+
+    # If there's a selected neighborhood, update map center to its centroid
+    if not neigh_df.empty:
+        centroid = neigh_df.geometry.centroid.unary_union
+        map_center = [centroid.y, centroid.x]
+
+    # Initialize Folium map centered at the neighborhood
+    map_ = folium.Map(location=map_center, zoom_start=detail_zoom, tiles = "CartoDB positron")
+
+    # Add vacant buildings with Tooltips, all zones when none are selected
+    PointLayer(vacant_df, marker="pin", color="green",
+               tooltip_fields=building_tooltip_fields, tooltip_aliases=building_tooltip_aliases,
+               popup=True, show="Vacant Buildings" in buildings, key="vacant",
+               category_field="zone_cat", categories=zones or None).add_to(map_)
+    # Add buildings for sale with Tooltips
+    PointLayer(sales_df, marker="pin", color="black",
+               tooltip_fields=building_tooltip_fields, tooltip_aliases=building_tooltip_aliases,
+               popup=True, show="Buildings for Sale" in buildings, key="sale",
+               category_field="zone_cat", categories=zones or None).add_to(map_)
+    LayerRegistry().add_to(map_)
+
+    # 🔹 Define Legend as Raw HTML (Works 100%)
+    legend_html = """
+    <div style="
+        position: fixed;
+        bottom: 40px; left: 20px; width: 200px; height: auto;
+        background-color: white; z-index:9999; font-size:14px;
+        padding: 10px; border-radius: 8px; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);
+    ">
+        <b>Legend</b><br>
+        <i style="background: green; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> Vacant Buildings <br>
+        <i style="background: black; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> Buildings for Sale <br>
+    </div>
+    """
+
+    # 🔹 Use `Element` instead of MacroElement
+    legend = Element(legend_html)
+    map_.get_root().html.add_child(legend)
+    timer.mark("build")
+
+    # Return the HTML representation of the map
+    map_html = map_._repr_html_()
+    timer.mark("serialize")
+    return map_html
+
+
+def payload(timer, map_html):
+    """Record an output's total render time and size, and wrap its HTML for the UI."""
+    timer.total()
+    metrics.payload_bytes.observe(len(map_html), output=timer.output)
+    return ui.HTML(map_html)
+
+
+def cache_metrics():
+    stats = map_cache.stats()
+    overlays = selected_tif_overlay.cache_info()
+    return [("kihc_render_cache_hits_total", "counter", "Detail maps served from the render cache.", stats["hits"]),
+            ("kihc_render_cache_misses_total", "counter", "Detail maps rendered on a cache miss.", stats["misses"]),
+            ("kihc_render_cache_size", "gauge", "Detail maps in the render cache.", stats["size"]),
+            ("kihc_tif_overlay_cache_hits_total", "counter", "Selected TIF overlays reused.", overlays.hits),
+            ("kihc_tif_overlay_cache_misses_total", "counter", "Selected TIF overlays serialized.", overlays.misses)]
+
+
+def cached_map(timer, key):
+    """Detail map for `key` from the render cache. A hit is recorded as a cache_hit
+    phase, a miss records the phases of the render itself."""
+    rendered = []
+
+    def render():
+        rendered.append(key)
+        return render_map(key, timer)
+
+    map_html = map_cache.get(key, render)
+    if not rendered:
+        timer.mark("cache_hit")
+    return map_html
+
+
+def render_map(key, timer=None):
+    """Render a detail map from its cache key (map type, TIF or neighborhood, layers, zones).
+
+    Without a timer (a warm-up render) its phases are recorded under the warm_up output.
+    """
+    kind, name, selected, zones = key
+    warm_up = timer is None
+    timer = metrics.PhaseTimer("warm_up") if warm_up else timer
+    if kind == "tif":
+        map_html = tif_map_html(name, selected, zones, timer)
+    else:
+        map_html = neighborhood_map_html(name, selected, zones, timer)
+    if warm_up:
+        timer.total()
+    return map_html
+
+
+# rendered detail maps are shared by every session, with KIHC_WARM_MAPS=n the n TIFs
+# and neighborhoods with the most sites are rendered with the default selections at startup
+map_cache = RenderCache()
+if warm_up_count():
+    popular_tifs = lots_index.counts().nlargest(warm_up_count()).index
+    popular_neighborhoods = vacant_index.counts().add(sale_index.counts(), fill_value=0).nlargest(warm_up_count()).index
+    map_cache.warm_up([("tif", name, tuple(layer_choices), tuple(zone_choices)) for name in popular_tifs] +
+                      [("neighborhood", name, tuple(building_choices), tuple(zone_choices))
+                       for name in popular_neighborhoods],
+                      render_map)
+metrics.collectors.append(cache_metrics)
 
 
 app_ui_page1 = ui.page_sidebar(
@@ -24,29 +291,22 @@ app_ui_page1 = ui.page_sidebar(
         ui.input_checkbox_group(
             "layers",
             "Select layers to display:",
-            choices=["TIF Districts", 
-                     "Metra and CTA 'L' Lines", 
-                     "ETOD Eligible Bus Corridors", 
-                     "ETOD Eligible City-Owned Land"],
-            selected=["TIF Districts", 
-                     "Metra and CTA 'L' Lines", 
-                     "ETOD Eligible Bus Corridors", 
-                     "ETOD Eligible City-Owned Land"]
+            choices=layer_choices,
+            selected=layer_choices
         ),
         ui.input_checkbox_group(
             "zones",
             "Filter by zoning classification:",
-            choices=["B-Business",
-                     "C-Commercial",
-                     "D-Downtown",
-                     "PD-Planned Development",
-                     "R-Residential"],
-            selected=["B-Business",
-                     "C-Commercial",
-                     "D-Downtown",
-                     "PD-Planned Development",
-                     "R-Residential"]
+            choices=zone_choices,
+            selected=zone_choices
+        ),
+        ui.input_radio_buttons(
+            "export_scope",
+            "Download the filtered lots:",
+            choices={"selected": "In the selected TIF District", "citywide": "Citywide"},
         ),
+        ui.input_select("export_format", "File format:", choices=list(EXPORT_FORMATS)),
+        ui.download_button("download_lots", "Download ETOD Eligible Land"),
         ui.div(
             ui.markdown("These analyses were conducted as part of a proposal for the 2025 Kreisman Initiative Housing Challenge. Team members: Claire Conzelmann, Alison Filbey, Maryell Abella, and Sarah Kim"),
             style="margin-top: auto; font-size: 12px; color: black;"
@@ -90,25 +350,23 @@ app_ui_page2 = ui.page_sidebar(
         ui.input_checkbox_group(
             "buildings",
             "Select what buildings to display:",
-            choices=["Vacant Buildings", 
-                     "Buildings for Sale"],
-            selected=["Vacant Buildings", 
-                     "Buildings for Sale"],
+            choices=building_choices,
+            selected=building_choices,
         ),
         ui.input_checkbox_group(
             "zones_2",
             "Filter by zoning classification:",
-            choices=["B-Business",
-                     "C-Commercial",
-                     "D-Downtown",
-                     "PD-Planned Development",
-                     "R-Residential"],
-            selected=["B-Business",
-                     "C-Commercial",
-                     "D-Downtown",
-                     "PD-Planned Development",
-                     "R-Residential"]
-        )
+            choices=zone_choices,
+            selected=zone_choices
+        ),
+        ui.input_radio_buttons(
+            "export_scope_2",
+            "Download the filtered buildings:",
+            choices={"selected": "In the selected neighborhood", "citywide": "Citywide"},
+        ),
+        ui.input_select("export_format_2", "File format:", choices=list(EXPORT_FORMATS)),
+        ui.download_button("download_vacant", "Download Vacant Buildings"),
+        ui.download_button("download_sale", "Download Buildings for Sale"),
 
     ),
 
@@ -142,6 +400,7 @@ app_ui_page2 = ui.page_sidebar(
 )
 
 app_ui = ui.page_navbar(
+    ui.head_content(ui.include_js(os.path.join(os.path.dirname(os.path.abspath(__file__)), "www/map_updates.js"))),
     ui.nav_spacer(),  
     ui.nav_panel("ETOD Eligible Land", app_ui_page1),
     ui.nav_panel("Vacant Buildings and Buildings for Sale", app_ui_page2),
@@ -151,359 +410,228 @@ app_ui = ui.page_navbar(
 # Server
 def server(input, output, session):
 
-    @reactive.calc
-    def zone_data():
-        df = etod_lots_tifs
-        # If zones are selected, filter the data by selected zones
-        if input.zones():
-            filtered_df = df[df["zone_cat"].isin(input.zones())]
+    async def update_map(output_id, layers, categories):
+        """Show/hide and filter the layers of a map that is already in the browser."""
+        await session.send_custom_message("kihc_map_update", {"output": output_id,
+                                                              "layers": layers,
+                                                              "categories": categories})
+
+    def export_positions(output_id, index, scope, selected, zones):
+        """Rows a download covers, filtered like the citywide or the detail map, and the
+        timer of the download with its filter phase marked."""
+        timer = metrics.PhaseTimer(output_id)
+        if scope == "citywide":
+            positions = index.positions(None, list(zones))
         else:
-            filtered_df = pd.DataFrame()
-        return filtered_df
-    
+            req(selected)
+            positions = index.positions(selected, list(zones) or None)
+        timer.mark("filter")
+        return positions, timer
+
+    async def stream_download(timer, layer, positions, fmt):
+        """Stream a download, recording its serialize phase, total time and size."""
+        size = 0
+        async for chunk in stream_rows(layer, positions, fmt):
+            size += len(chunk)
+            yield chunk
+        timer.mark("serialize")
+        timer.total()
+        metrics.payload_bytes.observe(size, output=timer.output)
+
+    def export_filename(layer, scope, selected, fmt):
+        place = "chicago" if scope == "citywide" else selected.lower().replace(" ", "_").replace("/", "_")
+        return f"{layer}_{place}.{EXPORT_FORMATS[fmt]}"
+
+    # the maps are only rebuilt when what they show changes (e.g. the selected TIF),
+    # layer and zoning selections are read without depending on them and later changes
+    # are sent to the map by the update effects
     @output
     @render.ui
     def full_map_plot():
-        zoned_lots = zone_data()
+        timer = metrics.PhaseTimer("full_map_plot")
+        with reactive.isolate():
+            layers = input.layers()
+            zones = input.zones()
 
         # Set default map center (Chicago)
         map_center = [41.8781, -87.6298]
 
         # Initialize Folium Map
-        map_ = folium.Map(location=map_center, zoom_start=11, tiles="CartoDB positron")
-
-        # Plot TIF Districts with tooltips
-        if "TIF Districts" in input.layers():
-            folium.GeoJson(
-                tif_districts_gdf,
-                name="TIF Districts",
-                style_function=lambda x: {"color": "purple", "weight": 1, "fillOpacity": 0.6},
-                tooltip=folium.GeoJsonTooltip(fields=["TIF_name"], aliases=["TIF District:"])  # Tooltip for TIFs
-            ).add_to(map_)
-
-        # Plot Metra and CTA 'L' Lines
-        if "Metra and CTA 'L' Lines" in input.layers():
-            folium.GeoJson(
-                rail_lines_gdf.to_crs(epsg=4326),
-                name="Metra and CTA 'L' Lines",
-                style_function=lambda x: {"color": "limegreen", "weight": 2, "fillOpacity": 0.8}
-            ).add_to(map_)
-
-        # Plot ETOD Eligible Bus Corridors
-        if "ETOD Eligible Bus Corridors" in input.layers():
-            folium.GeoJson(
-                bus_routes_gdf.to_crs(epsg=4326),
-                name="ETOD Eligible Bus Corridors",
-                style_function=lambda x: {"color": "darkgreen", "weight": 2, "fillOpacity": 0.8}
-            ).add_to(map_)
-
-        # Plot ETOD Eligible City-Owned Land as skyblue points (No tooltips)
-        if "ETOD Eligible City-Owned Land" in input.layers() and not zoned_lots.empty:
-            for _, row in zoned_lots.iterrows():
-                lat, lon = row.geometry.centroid.y, row.geometry.centroid.x  
-
-                folium.CircleMarker(
-                    location=[lat, lon],
-                    radius=3,  # Adjust marker size
-                    color="skyblue",
-                    fill=True,
-                    fill_color="skyblue",
-                    fill_opacity=0.5
-                ).add_to(map_)
-        # Add Layer Control
-        folium.LayerControl().add_to(map_)
+        map_ = folium.Map(location=map_center, zoom_start=overview_zoom, tiles="CartoDB positron")
+
+        if use_vector_tiles:
+            VectorTileLayer("tif_districts", tif_style, name="TIF Districts",
+                            show="TIF Districts" in layers, key="tif",
+                            tooltip_fields=["TIF_name"], tooltip_aliases=["TIF District:"]).add_to(map_)
+            VectorTileLayer("rail_lines", rail_style, name="Metra and CTA 'L' Lines",
+                            show="Metra and CTA 'L' Lines" in layers, key="rail").add_to(map_)
+            VectorTileLayer("bus_routes", bus_style, name="ETOD Eligible Bus Corridors",
+                            show="ETOD Eligible Bus Corridors" in layers, key="bus").add_to(map_)
+            VectorTileLayer("etod_lots_tifs", lot_point_style, name="ETOD Eligible City-Owned Land",
+                            show="ETOD Eligible City-Owned Land" in layers, key="lots",
+                            category_field="zone_cat", categories=zones).add_to(map_)
+        else:
+            # Plot TIF Districts with tooltips
+            tif_overlay.layer("TIF Districts", show="TIF Districts" in layers, key="tif").add_to(map_)
 
-        # Convert Map to HTML
-        return ui.HTML(map_._repr_html_())    
-    
-    @reactive.calc
-    def tif_data():
-        df = tif_districts_gdf
-        return df[df["TIF_name"] == input.tif()]
+            # Plot Metra and CTA 'L' Lines
+            rail_overlay.layer("Metra and CTA 'L' Lines", show="Metra and CTA 'L' Lines" in layers,
+                               key="rail").add_to(map_)
 
-    @reactive.calc
-    def lots_data():
-        df = etod_lots_tifs
-        filtered_df = df[df["TIF_name"] == input.tif()]
+            # Plot ETOD Eligible Bus Corridors
+            bus_overlay.layer("ETOD Eligible Bus Corridors", show="ETOD Eligible Bus Corridors" in layers,
+                              key="bus").add_to(map_)
 
-        # Filter based on selected zoning classifications
-        if input.zones():
-            filtered_df = filtered_df[filtered_df["zone_cat"].isin(input.zones())]
+            # Plot ETOD Eligible City-Owned Land as skyblue points (No tooltips)
+            PointLayer(etod_lots_tifs, name="ETOD Eligible City-Owned Land", style=lot_point_style,
+                       show="ETOD Eligible City-Owned Land" in layers, key="lots",
+                       category_field="zone_cat", categories=zones).add_to(map_)
+        # Add Layer Control
+        folium.LayerControl().add_to(map_)
+        LayerRegistry().add_to(map_)
 
-        return filtered_df
+        timer.mark("build")
 
+        # Convert Map to HTML
+        map_html = map_._repr_html_()
+        timer.mark("serialize")
+        return payload(timer, map_html)
+
+    @reactive.effect
+    async def _():
+        await update_map("full_map_plot", layer_visibility(input.layers(), lot_layer_keys),
+                         {"lots": list(input.zones())})
+    
     @output
     @render.ui
     def tif_district_plot():
-        tif_df = tif_data()
-        rail_df = rail_lines_gdf
-        bus_df = bus_routes_gdf
-        lots_df = lots_data()
-
-        # If there's a selected TIF, update map center to its centroid
-        if not tif_df.empty:
-            centroid = tif_df.geometry.centroid.unary_union
-            map_center = [centroid.y, centroid.x]
-
-        # Initialize Folium map centered at the TIF district
-        map_ = folium.Map(location=map_center, zoom_start=14, tiles = "CartoDB positron")
-        
-        # Add layers based on user selection
-        if "TIF Districts" in input.layers():
-            folium.GeoJson(
-                tif_df.geometry.to_json(),
-                style_function=lambda x: {'color': 'purple', 'weight': 1, 'fillOpacity': 0.5}
-            ).add_to(map_)
-                
-        if "Metra and CTA 'L' Lines" in input.layers():
-            folium.GeoJson(
-                rail_df.to_crs(epsg=4326).geometry.to_json(),
-                style_function=lambda x: {'color': 'limegreen', 'weight': 2, 'fillOpacity': 0.6}
-            ).add_to(map_)
-
-        if "ETOD Eligible Bus Corridors" in input.layers():
-            folium.GeoJson(
-                bus_df.to_crs(epsg=4326).geometry.to_json(),
-                style_function=lambda x: {'color': 'darkgreen', 'weight': 2, 'fillOpacity': 0.6}
-            ).add_to(map_)
+        with reactive.isolate():
+            layers = tuple(input.layers())
+            zones = tuple(input.zones())
+        # nothing to show until the dropdown is filled
+        req(input.tif())
+        key = ("tif", input.tif(), layers, zones)
+        timer = metrics.PhaseTimer("tif_district_plot")
+        return payload(timer, cached_map(timer, key))
 
-        
-    # Add ETOD Eligible City-Owned Land with Tooltips
-        if "ETOD Eligible City-Owned Land" in input.layers():
-            for idx, row in lots_df.iterrows():
-                lat, lon = row.geometry.centroid.y, row.geometry.centroid.x  # Get coordinates
-                tooltip_text = f"Zoning: {row['zoning']}<br>Proposed re-zoning: {row['re_zone']}<br>Address: {row['Address']}<br>Estimated # Units: {row['n_units']}"
-
-                folium.Marker(
-                    location=[lat, lon],
-                    tooltip=tooltip_text,  # Shows on hover
-                    popup=tooltip_text,  # Click to see full details
-                    icon=folium.Icon(color="blue", icon="info-sign")
-                ).add_to(map_)
-
-
-        # Define Legend as Raw HTML (Works 100%)
-        legend_html = """
-        <div style="
-            position: fixed;
-            bottom: 40px; left: 20px; width: 200px; height: auto;
-            background-color: white; z-index:9999; font-size:14px;
-            padding: 10px; border-radius: 8px; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);
-        ">
-            <b>Legend</b><br>
-            <i style="background: purple; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> TIF Districts <br>
-            <i style="background: limegreen; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> Metra and CTA 'L' Lines <br>
-            <i style="background: darkgreen; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> ETOD Eligible Bus Corridors <br>
-            <i style="background: skyblue; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> ETOD Eligible Land <br>
-        </div>
-        """
-
-        # 🔹 Use `Element` instead of MacroElement
-        legend = Element(legend_html)
-        map_.get_root().html.add_child(legend)
-
-       # Return the HTML representation of the map
-        map_html = map_._repr_html_()  # This gets the HTML representation of the map
-        
-        # Use ui.html to embed the map directly into the UI
-        return ui.HTML(map_html)
+    @reactive.effect
+    async def _():
+        await update_map("tif_district_plot", layer_visibility(input.layers(), lot_layer_keys),
+                         {"lots": list(input.zones()) or None})
         
     @reactive.effect
     def _():
-        tif_list = etod_lots_tifs["TIF_name"].unique().tolist()
-        tif_list = sorted(tif_list)
-        ui.update_select("tif", choices=tif_list)
+        ui.update_select("tif", choices=lots_index.keys)
 
+    # downloads stream the rows straight from the filter index, chunk by chunk
+    @render.download(filename=lambda: export_filename("etod_lots", input.export_scope(), input.tif(),
+                                                      input.export_format()))
+    async def download_lots():
+        positions, timer = export_positions("download_lots", lots_index, input.export_scope(), input.tif(),
+                                            input.zones())
+        async for chunk in stream_download(timer, etod_lots_tifs, positions, input.export_format()):
+            yield chunk
 
-# page 2
-    @reactive.calc
-    def zone_data_v():
-        df = vacant_buildings_gdf
-        zones = input.zones_2()  
-        if zones:
-            filtered_df_vacant = df[df["zone_cat"].isin(zones)]
-        else:
-            filtered_df_vacant = pd.DataFrame()
-        return filtered_df_vacant
 
-    
-    @reactive.calc
-    def zone_data_s():
-        df = sale_buildings_gdf
-        zones = input.zones_2()  
-        if zones:
-            filtered_df_sales = df[df["zone_cat"].isin(zones)]
-        else:
-            filtered_df_sales = pd.DataFrame()
-        return filtered_df_sales
-    
+# page 2
     @output
     @render.ui
     def chicago_plot():
-        zoned_vacant_buildings = zone_data_v() 
-        zoned_sale_buildings = zone_data_s() 
-        merged_neighborhoods_gdf['percent_ch'] = merged_neighborhoods_gdf['percent_ch'].apply(lambda x: round(x, 2))
-        colormap = branca.colormap.linear.RdPu_09.scale(merged_neighborhoods_gdf['percent_ch'].min(), merged_neighborhoods_gdf['percent_ch'].max())
+        timer = metrics.PhaseTimer("chicago_plot")
+        with reactive.isolate():
+            buildings = input.buildings()
+            zones = input.zones_2()
 
         # Set default map center (Chicago)
         map_center = [41.8781, -87.6298]
 
         # Initialize Folium Map
-        map_ = folium.Map(location=map_center, zoom_start=11, tiles="CartoDB positron")
+        map_ = folium.Map(location=map_center, zoom_start=overview_zoom, tiles="CartoDB positron")
         
 
-        folium.GeoJson(
-            merged_neighborhoods_gdf.to_crs(epsg=4326),
-            name="Neighborhood Percent Change",
-            style_function=lambda x: {
-                'fillColor': colormap(x['properties']['percent_ch']),  # Apply the color map
-                'weight': 1, 
-                'fillOpacity': 0.6,
-                'color': 'black'
-            },
-            tooltip=folium.GeoJsonTooltip(
-                fields=["Neigh", "percent_ch"], 
-                aliases=["Neighborhood", "Percent Change"],
-                localize=True  # 
-            )
-        ).add_to(map_)
-        colormap.caption = 'Percent Change in Avg. Assessed Value, 2000-2023'
+        if use_vector_tiles:
+            VectorTileLayer("neighborhood_level", neighborhood_style, name="Neighborhood Percent Change",
+                            tooltip_fields=["Neigh", "percent_change"],
+                            tooltip_aliases=["Neighborhood", "Percent Change"],
+                            style_field="Neigh", feature_style=neighborhood_fill).add_to(map_)
+        else:
+            neighborhood_overlay.layer("Neighborhood Percent Change").add_to(map_)
         colormap.add_to(map_)
-       
 
-       # Return the HTML representation of the map
-        map_html = map_._repr_html_()  # This gets the HTML representation of the map
-        
-        # plotting vacant buildings
-        if "Vacant Buildings" in input.buildings():
-                for _, row in zoned_vacant_buildings.iterrows():
-                    lat, lon = row.geometry.centroid.y, row.geometry.centroid.x
-
-                    folium.CircleMarker(
-                        location=[lat, lon],
-                        popup="Vacant Building",
-                        radius=2,
-                        color="green",
-                        fill=True,
-                        fill_color="green",
-                        fill_opacity=0.9  
-                    ).add_to(map_)
-
-        # plotting buildings for sale
-        if "Buildings for Sale" in input.buildings():
-                for _, row in zoned_sale_buildings.iterrows():
-                    lat, lon = row.geometry.centroid.y, row.geometry.centroid.x
-
-                    folium.CircleMarker(
-                        location=[lat, lon],
-                        popup="Building for Sale",
-                        radius=2,
-                        color="black",
-                        fill=True,
-                        fill_color="black",
-                        fill_opacity=0.9
-                    ).add_to(map_)
+        if use_vector_tiles:
+            VectorTileLayer("vacant_buildings", vacant_point_style, name="Vacant Buildings",
+                            show="Vacant Buildings" in buildings, key="vacant",
+                            category_field="zone_cat", categories=zones).add_to(map_)
+            VectorTileLayer("sale_buildings", sale_point_style, name="Buildings for Sale",
+                            show="Buildings for Sale" in buildings, key="sale",
+                            category_field="zone_cat", categories=zones).add_to(map_)
+        else:
+            # plotting vacant buildings
+            PointLayer(vacant_buildings_gdf, name="Vacant Buildings", popup="Vacant Building",
+                       style=vacant_point_style, show="Vacant Buildings" in buildings, key="vacant",
+                       category_field="zone_cat", categories=zones).add_to(map_)
+
+            # plotting buildings for sale
+            PointLayer(sale_buildings_gdf, name="Buildings for Sale", popup="Building for Sale",
+                       style=sale_point_style, show="Buildings for Sale" in buildings, key="sale",
+                       category_field="zone_cat", categories=zones).add_to(map_)
 
         folium.LayerControl().add_to(map_)
+        LayerRegistry().add_to(map_)
+        timer.mark("build")
 
-        return ui.HTML(map_._repr_html_())
-    
-    @reactive.calc
-    def neigh_data():
-        df = merged_neighborhoods_gdf
-        return df[df["Neigh"] == input.neighborhood()]
-
-    @reactive.calc
-    def sales_data():
-        df = sale_buildings_gdf
-        filtered_df = df[df["Neigh"] == input.neighborhood()]
-        if input.zones_2():
-            filtered_df = filtered_df[filtered_df["zone_cat"].isin(input.zones_2())]
-
-        return filtered_df
-
-    @reactive.calc
-    def vacant_data():
-        df = vacant_buildings_gdf
-        filtered_df = df[df["Neigh"] == input.neighborhood()]
-        if input.zones_2():
-            filtered_df = filtered_df[filtered_df["zone_cat"].isin(input.zones_2())]
-
-        return filtered_df
-    
+        map_html = map_._repr_html_()
+        timer.mark("serialize")
+        return payload(timer, map_html)
 
+    @reactive.effect
+    async def _():
+        zones = list(input.zones_2())
+        await update_map("chicago_plot", layer_visibility(input.buildings(), building_layer_keys),
+                         {"vacant": zones, "sale": zones})
+    
     @output
     @render.ui
     def neighborhood_plot():
-        neigh_df = neigh_data()
-        sales_df = sales_data()
-        vacant_df = vacant_data()
-
-
-        # If there's a selected neighborhood, update map center to its centroid
-        if not neigh_df.empty:
-            centroid = neigh_df.geometry.centroid.unary_union
-            map_center = [centroid.y, centroid.x]
-
-        # Initialize Folium map centered at the neighborhood
-        map_ = folium.Map(location=map_center, zoom_start=14, tiles = "CartoDB positron")
-
-    # Add vacant buildings with Tooltips
-        if "Vacant Buildings" in input.buildings():
-            for idx, row in vacant_df.iterrows():
-                lat, lon = row.geometry.centroid.y, row.geometry.centroid.x  # Get coordinates
-                tooltip_text = f"Zoning: {row['zoning'] if 'zoning' in row else 'N/A'}<br>Proposed re-zoning: {row['re_zone']}<br>Address: {row['Address']}<br>Number of Units: {row['n_units']}"
-
-                folium.Marker(
-                    location=[lat, lon],
-                    tooltip=tooltip_text,  # Shows on hover
-                    popup=tooltip_text,  # Click to see full details
-                    icon=folium.Icon(color="green", icon="info-sign")
-                ).add_to(map_)
-    # Add buildings for sale with Tooltips
-        if "Buildings for Sale" in input.buildings():
-            for idx, row in sales_df.iterrows():
-                lat, lon = row.geometry.centroid.y, row.geometry.centroid.x  # Get coordinates
-                tooltip_text = f"Zoning: {row['zoning'] if 'zoning' in row else 'N/A'}<br>Proposed re-zoning: {row['re_zone']}<br>Address: {row['Address']}<br>Number of Units: {row['n_units']}"
-
-                folium.Marker(
-                    location=[lat, lon],
-                    tooltip=tooltip_text,  # Shows on hover
-                    popup=tooltip_text,  # Click to see full details
-                    icon=folium.Icon(color="black", icon="info-sign")
-                ).add_to(map_)
-
-        # 🔹 Define Legend as Raw HTML (Works 100%)
-        legend_html = """
-        <div style="
-            position: fixed;
-            bottom: 40px; left: 20px; width: 200px; height: auto;
-            background-color: white; z-index:9999; font-size:14px;
-            padding: 10px; border-radius: 8px; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);
-        ">
-            <b>Legend</b><br>
-            <i style="background: green; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> Vacant Buildings <br>
-            <i style="background: black; width: 12px; height: 12px; display: inline-block; border-radius: 2px;"></i> Buildings for Sale <br>
-        </div>
-        """
-
-        # 🔹 Use `Element` instead of MacroElement
-        legend = Element(legend_html)
-        map_.get_root().html.add_child(legend)
-
-       # Return the HTML representation of the map
-        map_html = map_._repr_html_()  # This gets the HTML representation of the map
-        
-        # Use ui.html to embed the map directly into the UI
-        return ui.HTML(map_html)
+        with reactive.isolate():
+            buildings = tuple(input.buildings())
+            zones = tuple(input.zones_2())
+        req(input.neighborhood())
+        key = ("neighborhood", input.neighborhood(), buildings, zones)
+        timer = metrics.PhaseTimer("neighborhood_plot")
+        return payload(timer, cached_map(timer, key))
+
+    @reactive.effect
+    async def _():
+        zones = list(input.zones_2()) or None
+        await update_map("neighborhood_plot", layer_visibility(input.buildings(), building_layer_keys),
+                         {"vacant": zones, "sale": zones})
         
     @reactive.effect
     def _():
-        neigh_list = merged_neighborhoods_gdf["Neigh"].unique().tolist()
-        neigh_list = sorted(neigh_list)
-        ui.update_select("neighborhood", choices=neigh_list)
-
-
-
-# Run the app
-app = App(app_ui, server)
\ No newline at end of file
+        ui.update_select("neighborhood", choices=neighborhood_index.keys)
+
+    @render.download(filename=lambda: export_filename("vacant_buildings", input.export_scope_2(),
+                                                      input.neighborhood(), input.export_format_2()))
+    async def download_vacant():
+        positions, timer = export_positions("download_vacant", vacant_index, input.export_scope_2(),
+                                            input.neighborhood(), input.zones_2())
+        async for chunk in stream_download(timer, vacant_buildings_gdf, positions, input.export_format_2()):
+            yield chunk
+
+    @render.download(filename=lambda: export_filename("sale_buildings", input.export_scope_2(),
+                                                      input.neighborhood(), input.export_format_2()))
+    async def download_sale():
+        positions, timer = export_positions("download_sale", sale_index, input.export_scope_2(),
+                                            input.neighborhood(), input.zones_2())
+        async for chunk in stream_download(timer, sale_buildings_gdf, positions, input.export_format_2()):
+            yield chunk
+
+
+
+# Run the app, with render metrics for Prometheus at /metrics
+app = App(app_ui, server)
+routes = [Route("/metrics", metrics.metrics_endpoint)]
+if use_vector_tiles:
+    routes.append(Mount("/tiles", app=tile_app()))
+app = Starlette(routes=routes + [Mount("/", app=app)])
\ No newline at end of file
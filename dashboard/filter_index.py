@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+
+class FilterIndex:
+    """Row positions of a layer for each value of a key column, built once at load.
+
+    Every row also gets a bitmask of its `category` column (one bit per category),
+    so filtering to a key and a set of categories is a dictionary lookup plus a
+    bitwise and over that key's rows, instead of scanning the whole layer.
+    """
+
+    def __init__(self, gdf, key, category=None):
+        self.gdf = gdf
+        codes, values = pd.factorize(gdf[key], sort=True)
+        order = np.argsort(codes, kind="stable")
+        # rows without a key (code -1) sort first and are left out
+        bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+        self.rows = {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(values)}
+        # keys in dropdown order
+        self.keys = list(values)
+
+        self.category = category
+        self.bits = {}
+        self.masks = None
+        if category is not None:
+            cat_codes, categories = pd.factorize(gdf[category])
+            if len(categories) > 63:
+                raise ValueError(f"too many categories in '{category}' for a 64-bit mask")
+            self.bits = {value: np.uint64(1) << np.uint64(i) for i, value in enumerate(categories)}
+            # rows without a category get no bits and never match a category filter
+            self.masks = np.where(cat_codes >= 0, np.left_shift(np.uint64(1), cat_codes.astype(np.uint64)),
+                                  np.uint64(0))
+
+    def positions(self, key, categories=None):
+        """Row positions for `key` (every row when None), limited to `categories` when given.
+
+        Filtering by categories needs an index built with a `category` column.
+        """
+        if key is None:
+            rows = np.arange(len(self.gdf))
+        else:
+            rows = self.rows.get(key, np.empty(0, dtype=np.intp))
+        if categories is None:
+            return rows
+        if self.masks is None:
+            raise ValueError("this index has no category column to filter by")
+        wanted = np.uint64(0)
+        for value in categories:
+            wanted |= self.bits.get(value, np.uint64(0))
+        return rows[(self.masks[rows] & wanted) != 0]
+
+    def take(self, key, categories=None):
+        """Rows of the layer for `key` (and `categories`), in their original order."""
+        # positional take on a GeoDataFrame, a shared layer decodes only these rows
+        return self.gdf.take(self.positions(key, categories))
+
+    def counts(self):
+        """Number of rows per key."""
+        return pd.Series({key: len(rows) for key, rows in self.rows.items()}, dtype=int)
@@ -0,0 +1,85 @@
+import json
+import os
+import geopandas as gpd
+import pyarrow.parquet as pq
+
+app_dir = os.path.dirname(os.path.abspath(__file__))
+
+# shapefiles cut column names to 10 characters, map them back when reading old files.
+# keep in sync with SHAPEFILE_COLUMNS in Code/layer_io.py, the dashboard is deployed
+# without the Code folder so it keeps its own copy
+SHAPEFILE_COLUMNS = {"station_na": "station_name",
+                     "percent_ch": "percent_change",
+                     "Property N": "Property Name",
+                     "Property S": "Property Status",
+                     "Community ": "Community Area Name",
+                     "Asking Pri": "Asking Price",
+                     "index_righ": "index_right",
+                     "re_zone_ca": "re_zone_cat",
+                     "lot_area_p": "lot_area_per_unit",
+                     "sq_ft_rent": "sq_ft_rentable",
+                     "sq_ft_resi": "sq_ft_residential",
+                     "avg_unit_s": "avg_unit_size",
+                     "imputed_n_": "imputed_n_units"}
+
+
+def find_data_dir():
+    """Folder holding the processed layers.
+
+    The pipeline writes one GeoParquet copy of each layer to Data/Processed at the repo
+    root. The dashboard reads that copy when run from the repo, and reads its own
+    Data/Processed folder when deployed on its own. KIHC_DATA_DIR overrides both.
+    """
+    if os.environ.get("KIHC_DATA_DIR"):
+        return os.environ["KIHC_DATA_DIR"]
+    candidates = [os.path.join(os.getcwd(), "Data/Processed"),
+                  os.path.join(app_dir, "Data/Processed"),
+                  os.path.join(app_dir, "..", "Data/Processed")]
+    for folder in candidates:
+        if os.path.exists(os.path.join(folder, "tif_districts.parquet")):
+            return folder
+    return os.path.join(os.getcwd(), "Data/Processed")
+
+
+DATA_DIR = find_data_dir()
+
+
+def read_layer(name, columns=None, filters=None):
+    """Read a processed layer, loading only the requested columns and rows.
+
+    `columns` should not include the geometry column, it is always read. `filters`
+    ([(column, op, value), ...]) are pushed down to the parquet reader.
+    """
+    parquet_path = os.path.join(DATA_DIR, name + ".parquet")
+    if os.path.exists(parquet_path):
+        if columns is not None:
+            geo = json.loads(pq.read_schema(parquet_path).metadata[b"geo"])
+            columns = list(columns) + [geo["primary_column"]]
+        return gpd.read_parquet(parquet_path, columns=columns, filters=filters)
+
+    # older deployments only have shapefiles, only == and in filters are used for them
+    gdf = gpd.read_file(os.path.join(DATA_DIR, name + ".shp"))
+    gdf = gdf.rename(columns=SHAPEFILE_COLUMNS)
+    for col, op, value in filters or []:
+        gdf = gdf[gdf[col].isin(value) if op == "in" else gdf[col] == value]
+    if columns is not None:
+        gdf = gdf[list(columns) + [gdf.geometry.name]]
+    return gdf
+
+
+def read_layer_for_zoom(name, zoom, columns=None):
+    """A polygon layer simplified for a map zoom (see Code/simplify_layers.py).
+
+    Reads the <name>_z<level> copy with the highest level not above `zoom`, simplified
+    to about a screen pixel at that level, or the full layer if there is none.
+    """
+    levels = []
+    for f in os.listdir(DATA_DIR) if os.path.isdir(DATA_DIR) else []:
+        stem, ext = os.path.splitext(f)
+        level = stem[len(name) + 2:]
+        if stem.startswith(name + "_z") and level.isdigit() and ext in (".parquet", ".shp"):
+            levels.append(int(level))
+    levels = [level for level in levels if level <= zoom]
+    if not levels:
+        return read_layer(name, columns=columns)
+    return read_layer(f"{name}_z{max(levels)}", columns=columns)
@@ -0,0 +1,293 @@
+import json
+import numpy as np
+import pandas as pd
+import shapely
+from branca.element import MacroElement, Template
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from folium.plugins import MarkerCluster, VectorGridProtobuf
+
+# ~10 cm at Chicago's latitude, plenty for display
+COORD_DECIMALS = 6
+
+# layers created with a key are registered in window.kihcLayers inside the map's
+# iframe, so the page can show, hide or filter them later without a new map
+REGISTER_LAYER = """
+        {%- if this.key %}
+        window.kihcLayers = window.kihcLayers || {};
+        window.kihcLayers[{{ this.key|tojson }}] = {layer: {{ this.get_name() }},
+                                                     map: {{ this._parent.get_name() }}};
+        {%- endif %}
+"""
+
+
+def feature_collection(gdf, properties=None):
+    """Serialize a GeoDataFrame as a GeoJSON FeatureCollection string in EPSG:4326.
+
+    Geometries are converted and coordinates rounded in bulk, `properties` is an
+    optional frame (aligned with `gdf`) of the properties to keep.
+    """
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+    geometries = shapely.transform(gdf.geometry.to_numpy(), lambda c: np.round(c, COORD_DECIMALS))
+    geometries = shapely.to_geojson(geometries)
+    if properties is None or len(properties.columns) == 0:
+        records = ["{}"] * len(gdf)
+    else:
+        records = properties.to_json(orient="records", lines=True).splitlines()
+    features = ",".join(f'{{"type":"Feature","geometry":{geometry},"properties":{record}}}'
+                        for geometry, record in zip(geometries, records))
+    return '{"type":"FeatureCollection","features":[' + features + "]}"
+
+
+def tooltip_html(df, fields, aliases, bold=True):
+    """"<b>alias</b> value" lines for every row, built column by column."""
+    html = pd.Series("", index=getattr(df, "index", pd.RangeIndex(len(df))))
+    for i, (field, alias) in enumerate(zip(fields, aliases)):
+        label = f"<b>{alias}</b> " if bold else f"{alias} "
+        html = html + ("<br>" if i else "") + label + df[field].astype(str)
+    return html
+
+
+def point_coordinates(gdf):
+    """Rounded lat and lon lists of each geometry's centroid, in EPSG:4326.
+
+    A shared layer (see shared_layers) gives its stored point coordinates instead.
+    """
+    if hasattr(gdf, "point_coordinates"):
+        lat, lon = gdf.point_coordinates()
+        coords = np.column_stack([lon, lat])
+    else:
+        if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+            gdf = gdf.to_crs(epsg=4326)
+        coords = shapely.get_coordinates(shapely.centroid(gdf.geometry.to_numpy()))
+    coords = np.round(coords, COORD_DECIMALS)
+    return coords[:, 1].tolist(), coords[:, 0].tolist()
+
+
+class Overlay:
+    """A static map overlay, serialized once with its style baked in.
+
+    `style` is the Leaflet path style shared by every feature, `feature_style` an
+    optional Series of per-feature style dicts (e.g. a choropleth fill color).
+    """
+
+    def __init__(self, gdf, style, tooltip_fields=None, tooltip_aliases=None, feature_style=None):
+        properties = pd.DataFrame(index=gdf.index)
+        if tooltip_fields:
+            properties["tooltip"] = tooltip_html(gdf, tooltip_fields, tooltip_aliases or tooltip_fields)
+        if feature_style is not None:
+            properties["style"] = feature_style
+        self.data = feature_collection(gdf, properties)
+        self.style = json.dumps(style)
+        self.has_tooltip = bool(tooltip_fields)
+
+    def layer(self, name=None, show=True, key=None):
+        """Folium layer referencing the cached payload, cheap to build on every render."""
+        return GeoJsonOverlay(self, name=name, show=show, key=key)
+
+
+class GeoJsonOverlay(Layer):
+    """Adds a pre-serialized Overlay to a folium map without re-serializing it."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson({{ this.overlay.data }}, {
+            style: function(feature) {
+                return Object.assign({}, {{ this.overlay.style }}, feature.properties.style || {});
+            },
+            {%- if this.overlay.has_tooltip %}
+            onEachFeature: function(feature, layer) {
+                layer.bindTooltip(feature.properties.tooltip, {sticky: true});
+            },
+            {%- endif %}
+        });
+        """ + REGISTER_LAYER + """
+        {% endmacro %}
+        """)
+
+    def __init__(self, overlay, name=None, show=True, key=None):
+        super().__init__(name=name, overlay=True, show=show)
+        self._name = "GeoJsonOverlay"
+        self.overlay = overlay
+        self.key = key
+
+
+class PointLayer(JSCSSMixin, Layer):
+    """Every point of a GeoDataFrame (or a shared layer) as one folium layer.
+
+    Coordinates and tooltips are built column by column and sent as one columnar
+    payload, the browser creates the markers. `marker` is "circle" (a circle
+    marker styled with `style`) or "pin" (an info-sign pin in `color`). `popup`
+    is a fixed text, True to reuse the tooltip, or None. With `cluster` nearby
+    markers are grouped client side.
+
+    With a `category_field` every point keeps its category and only the points in
+    `categories` (None for all) are shown; the layer's filter (see LayerRegistry)
+    changes which categories are shown without sending the points again.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var data = {{ this.data }};
+            var group = {{ "L.markerClusterGroup()" if this.cluster else "L.featureGroup()" }};
+            {%- if this.marker == "pin" %}
+            var icon = L.AwesomeMarkers.icon({icon: "info-sign", markerColor: {{ this.color|tojson }}, prefix: "glyphicon"});
+            {%- endif %}
+            var markers = [];
+            for (var i = 0; i < data.lat.length; i++) {
+                {%- if this.marker == "pin" %}
+                var marker = L.marker([data.lat[i], data.lon[i]], {icon: icon});
+                {%- else %}
+                var marker = L.circleMarker([data.lat[i], data.lon[i]], {{ this.style }});
+                {%- endif %}
+                if (data.tooltip) { marker.bindTooltip(data.tooltip[i]); }
+                if (data.popup === true) { marker.bindPopup(data.tooltip[i]); }
+                else if (data.popup) { marker.bindPopup(data.popup); }
+                markers.push(marker);
+            }
+            group.kihcFilter = function(categories) {
+                // null shows every point
+                var shown = categories ? new Set(categories) : null;
+                var keep = data.category && shown ? markers.filter(function(marker, i) { return shown.has(data.category[i]); })
+                                                  : markers;
+                group.clearLayers();
+                if (group.addLayers) { group.addLayers(keep); }
+                else { keep.forEach(function(marker) { group.addLayer(marker); }); }
+            };
+            group.kihcFilter(data.categories);
+            return group;
+        })();
+        """ + REGISTER_LAYER + """
+        {%- if this.key %}
+        window.kihcLayers[{{ this.key|tojson }}].filter = {{ this.get_name() }}.kihcFilter;
+        {%- endif %}
+        {% endmacro %}
+        """)
+
+    def __init__(self, gdf, name=None, marker="circle", style=None, color="blue",
+                 tooltip_fields=None, tooltip_aliases=None, popup=None, cluster=False, show=True,
+                 key=None, category_field=None, categories=None):
+        super().__init__(name=name, overlay=True, show=show)
+        self._name = "PointLayer"
+        lat, lon = point_coordinates(gdf)
+        data = {"lat": lat, "lon": lon, "popup": popup}
+        if category_field:
+            data["category"] = gdf[category_field].astype(object).where(gdf[category_field].notna(), None).tolist()
+            data["categories"] = list(categories) if categories is not None else None
+        if tooltip_fields:
+            data["tooltip"] = tooltip_html(gdf, tooltip_fields, tooltip_aliases or tooltip_fields, bold=False).tolist()
+        self.data = json.dumps(data, separators=(",", ":")).replace("</", "<\\/")
+        self.marker = marker
+        self.style = json.dumps(style or {})
+        self.color = color
+        self.cluster = cluster
+        self.key = key
+        self.default_js = MarkerCluster.default_js if cluster else []
+        self.default_css = MarkerCluster.default_css if cluster else []
+
+
+class VectorTileLayer(JSCSSMixin, Layer):
+    """A layer drawn from the dashboard's vector tiles (see tile_server).
+
+    The browser only fetches the tiles in view, each already simplified for its
+    zoom, instead of the whole layer. `style` is shared by every feature,
+    `feature_style` maps values of `style_field` to extra style (e.g. a choropleth
+    fill color). Tooltips and category filtering work as in PointLayer.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var data = {{ this.data }};
+            var shown = data.categories ? new Set(data.categories) : null;
+            var styles = {};
+            styles[data.layer] = function(properties, zoom) {
+                if (shown && data.category_field && !shown.has(properties[data.category_field])) { return []; }
+                var extra = data.style_field ? data.feature_style[properties[data.style_field]] : null;
+                return Object.assign({}, data.style, extra || {});
+            };
+            var grid = L.vectorGrid.protobuf(data.url, {
+                rendererFactory: L.canvas.tile,
+                vectorTileLayerStyles: styles,
+                interactive: !!data.tooltip_fields,
+                minNativeZoom: data.min_zoom,
+                maxNativeZoom: data.max_zoom
+            });
+            if (data.tooltip_fields) {
+                var tooltip = L.tooltip({sticky: true});
+                grid.on("mouseover", function(e) {
+                    var html = data.tooltip_fields.map(function(field, i) {
+                        return "<b>" + data.tooltip_aliases[i] + "</b> " + e.layer.properties[field];
+                    }).join("<br>");
+                    tooltip.setLatLng(e.latlng).setContent(html);
+                    {{ this._parent.get_name() }}.openTooltip(tooltip);
+                });
+                grid.on("mouseout", function() { {{ this._parent.get_name() }}.closeTooltip(tooltip); });
+            }
+            grid.kihcFilter = function(categories) {
+                shown = categories ? new Set(categories) : null;
+                grid.redraw();
+            };
+            return grid;
+        })();
+        """ + REGISTER_LAYER + """
+        {%- if this.key %}
+        window.kihcLayers[{{ this.key|tojson }}].filter = {{ this.get_name() }}.kihcFilter;
+        {%- endif %}
+        {% endmacro %}
+        """)
+
+    default_js = VectorGridProtobuf.default_js
+
+    def __init__(self, layer, style, name=None, show=True, key=None,
+                 tooltip_fields=None, tooltip_aliases=None, style_field=None, feature_style=None,
+                 category_field=None, categories=None, min_zoom=10, max_zoom=16,
+                 url="tiles/{layer}/{{z}}/{{x}}/{{y}}.pbf"):
+        super().__init__(name=name, overlay=True, show=show)
+        self._name = "VectorTileLayer"
+        # the url is relative so it works wherever the app is mounted, the map's
+        # iframe resolves it against the dashboard page
+        data = {"layer": layer, "url": url.format(layer=layer), "style": style,
+                "min_zoom": min_zoom, "max_zoom": max_zoom,
+                "style_field": style_field, "feature_style": feature_style or {},
+                "category_field": category_field,
+                "categories": list(categories) if categories is not None else None,
+                "tooltip_fields": tooltip_fields,
+                "tooltip_aliases": tooltip_aliases or tooltip_fields}
+        self.data = json.dumps(data, separators=(",", ":")).replace("</", "<\\/")
+        self.key = key
+
+
+class LayerRegistry(MacroElement):
+    """Applies layer updates sent by the page to the layers registered in this map.
+
+    Messages look like {"kihc": {"layers": {key: visible}, "categories": {key: [...]}}}.
+    Add it to the map after its layers; it tells the page the map is ready so the
+    latest state is re-sent if it changed while the map was loading.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        window.kihcLayers = window.kihcLayers || {};
+        window.addEventListener("message", function(event) {
+            var update = event.data && event.data.kihc;
+            if (!update) { return; }
+            Object.entries(update.layers || {}).forEach(function([key, visible]) {
+                var entry = window.kihcLayers[key];
+                if (!entry) { return; }
+                if (visible) { entry.map.addLayer(entry.layer); } else { entry.map.removeLayer(entry.layer); }
+            });
+            Object.entries(update.categories || {}).forEach(function([key, categories]) {
+                var entry = window.kihcLayers[key];
+                if (entry && entry.filter) { entry.filter(categories); }
+            });
+        });
+        if (window.parent !== window) { window.parent.postMessage({kihcReady: true}, "*"); }
+        {% endmacro %}
+        """)
+
+    def __init__(self):
+        super().__init__()
+        self._name = "LayerRegistry"
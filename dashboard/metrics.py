@@ -0,0 +1,94 @@
+import threading
+import time
+
+import psutil
+from starlette.responses import PlainTextResponse
+
+# histogram bucket upper bounds
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BYTES_BUCKETS = [1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7]
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    """A Prometheus histogram with one series per set of label values."""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def lines(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {key: list(counts) for key, counts in self.series.items()}
+        for key, counts in sorted(series.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{self.name}_bucket{format_labels(key + (('le', '+Inf'),))} {counts[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {float(counts[-2])!r}")
+            lines.append(f"{self.name}_count{format_labels(key)} {counts[-1]}")
+        return lines
+
+
+render_seconds = Histogram("kihc_render_phase_seconds",
+                           "Time spent per map output and phase (filter, build, serialize, total).",
+                           SECONDS_BUCKETS)
+payload_bytes = Histogram("kihc_render_payload_bytes", "Size of the HTML sent per map output.", BYTES_BUCKETS)
+
+# functions returning [(name, type, help, value)] read when /metrics is scraped
+collectors = []
+
+
+class PhaseTimer:
+    """Times consecutive phases of one render; mark(phase) closes the current phase."""
+
+    def __init__(self, output):
+        self.output = output
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        render_seconds.observe(now - self.last, output=self.output, phase=phase)
+        self.last = now
+
+    def total(self):
+        render_seconds.observe(time.perf_counter() - self.start, output=self.output, phase="total")
+
+
+def process_metrics():
+    memory = psutil.Process().memory_info()
+    return [("kihc_process_resident_memory_bytes", "gauge", "Resident memory of the app process.", memory.rss)]
+
+
+collectors.append(process_metrics)
+
+
+def metrics_text():
+    """Every metric in the Prometheus text exposition format."""
+    lines = render_seconds.lines() + payload_bytes.lines()
+    for collect in collectors:
+        for name, kind, help, value in collect():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value!r}"]
+    return "\n".join(lines) + "\n"
+
+
+def metrics_endpoint(request):
+    return PlainTextResponse(metrics_text(), media_type="text/plain; version=0.0.4")
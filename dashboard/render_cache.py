@@ -0,0 +1,76 @@
+import os
+import threading
+from collections import OrderedDict
+
+# maps kept by the render cache, each rendered detail map is ~50-300 KB of HTML
+DEFAULT_MAXSIZE = int(os.environ.get("KIHC_RENDER_CACHE_SIZE", 256))
+
+
+class RenderCache:
+    """Process-wide LRU cache of rendered maps, shared by every session.
+
+    Keys are tuples of everything that determines a map (e.g. the selected TIF,
+    layers and zones), values the rendered HTML. Once `maxsize` maps are cached
+    the least recently used one is dropped.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.maps = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        """Cached map for `key`, calling `render()` to build it on a miss."""
+        with self.lock:
+            if key in self.maps:
+                self.hits += 1
+                self.maps.move_to_end(key)
+                return self.maps[key]
+            self.misses += 1
+
+        # render outside the lock so other sessions aren't blocked, two sessions
+        # missing the same key at once both render it
+        html = render()
+        with self.lock:
+            self.maps[key] = html
+            self.maps.move_to_end(key)
+            while len(self.maps) > self.maxsize:
+                self.maps.popitem(last=False)
+        return html
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {"size": len(self.maps),
+                    "maxsize": self.maxsize,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / requests if requests else None}
+
+    def warm_up(self, keys, render, background=True):
+        """Render `keys` ahead of time; render(key) builds the map for a key.
+
+        Runs in a daemon thread by default so the app starts serving right away.
+        Warm-up renders don't count as misses.
+        """
+        def run():
+            for key in keys:
+                html = render(key)
+                with self.lock:
+                    if key not in self.maps:
+                        self.maps[key] = html
+                        while len(self.maps) > self.maxsize:
+                            self.maps.popitem(last=False)
+
+        if background:
+            thread = threading.Thread(target=run, name="kihc-map-warm-up", daemon=True)
+            thread.start()
+            return thread
+        run()
+
+
+def warm_up_count():
+    """Number of popular maps to render at startup per map type, from KIHC_WARM_MAPS."""
+    return int(os.environ.get("KIHC_WARM_MAPS", 0))
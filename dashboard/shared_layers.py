@@ -0,0 +1,86 @@
+import os
+
+import geopandas as gpd
+import pyarrow as pa
+import shapely
+
+from layers import DATA_DIR, read_layer
+
+# Arrow IPC copies of the layers written by Code/export_shared_layers.py
+SHARED_DIR = os.path.join(DATA_DIR, "shared")
+
+# with KIHC_SHARED_LAYERS=1 the point layers (lots, vacant and for sale buildings) are
+# memory mapped instead of loaded, so every worker process reads the same pages from
+# the OS cache. The polygon and line layers are serialized into map overlays once at
+# startup and stay loaded in each worker
+USE_SHARED_LAYERS = os.environ.get("KIHC_SHARED_LAYERS") == "1"
+
+
+def plain(array):
+    """Decode a dictionary encoded column back to its values."""
+    if pa.types.is_dictionary(array.type):
+        return array.cast(array.type.value_type)
+    return array
+
+
+class SharedLayer:
+    """A processed layer memory mapped read-only from its Arrow IPC copy.
+
+    Nothing is copied when the layer is opened: columns are read from the mapped
+    file on use, and take() only decodes the rows (and geometries) asked for. Point
+    layers hand their coordinates to the maps without decoding any geometry.
+    """
+
+    def __init__(self, name, columns=None, folder=SHARED_DIR):
+        source = pa.memory_map(os.path.join(folder, name + ".arrow"), "r")
+        table = pa.ipc.open_file(source).read_all()
+        metadata = table.schema.metadata
+        self.name = name
+        self.geometry_column = metadata[b"geometry_column"].decode()
+        self.crs = metadata[b"crs"].decode() or None
+        self.coordinate_columns = metadata.get(b"coordinate_columns", b"").decode().split(",") if \
+            metadata.get(b"coordinate_columns") else []
+        if columns is not None:
+            table = table.select(list(columns) + self.coordinate_columns + [self.geometry_column])
+        self.table = table
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __getitem__(self, column):
+        return plain(self.table.column(column)).to_pandas()
+
+    def take(self, positions):
+        """GeoDataFrame of the rows at `positions`."""
+        return self.frame(self.table.take(pa.array(positions, type=pa.int64())))
+
+    def point_coordinates(self):
+        """lat and lon arrays of every point in EPSG:4326, viewed from the mapped columns."""
+        if self.coordinate_columns:
+            lon, lat = (self.table.column(col).to_numpy() for col in self.coordinate_columns)
+            return lat, lon
+        geometry = gpd.GeoSeries(shapely.from_wkb(self.table.column(self.geometry_column).to_numpy(
+            zero_copy_only=False)), crs=self.crs).centroid.to_crs(epsg=4326)
+        return geometry.y.to_numpy(), geometry.x.to_numpy()
+
+    def attribute_schema(self):
+        """Arrow schema of the attribute columns, as take() returns them."""
+        skip = set(self.coordinate_columns) | {self.geometry_column}
+        return pa.schema([pa.field(field.name, field.type.value_type if pa.types.is_dictionary(field.type)
+                                   else field.type)
+                          for field in self.table.schema if field.name not in skip])
+
+    def frame(self, table):
+        skip = set(self.coordinate_columns) | {self.geometry_column}
+        df = pa.table({col: plain(table.column(col)) for col in table.column_names
+                       if col not in skip}).to_pandas()
+        geometry = shapely.from_wkb(table.column(self.geometry_column).to_numpy(zero_copy_only=False))
+        return gpd.GeoDataFrame(df, geometry=geometry, crs=self.crs)
+
+
+def open_layer(name, columns=None):
+    """The shared, memory mapped copy of a layer when enabled and exported, else the layer."""
+    if USE_SHARED_LAYERS and os.path.exists(os.path.join(SHARED_DIR, name + ".arrow")):
+        return SharedLayer(name, columns)
+    return read_layer(name, columns=columns)
+
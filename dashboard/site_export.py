@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+# download formats and their file extensions
+EXPORT_FORMATS = {"CSV": "csv", "GeoJSON": "geojson", "GeoParquet": "parquet"}
+
+# rows decoded and written at a time, so an export never holds the whole layer
+CHUNK_ROWS = 2000
+
+
+def csv_chunk(gdf, first):
+    df = gdf.to_wkt()
+    return df.to_csv(index=False, header=first)
+
+
+def geojson_chunk(gdf, first):
+    features = ",\n".join(json.dumps(feature) for feature in
+                          gdf.to_crs(4326).iterfeatures(na="null", drop_id=True))
+    return features if first or not features else ",\n" + features
+
+
+def layer_schema(layer):
+    """Arrow schema of a layer's attribute columns, taken from the whole layer.
+
+    A chunk's own schema can be narrower (e.g. a text column that is all empty in
+    the first chunk reads as null), so every chunk is cast to this one.
+    """
+    if hasattr(layer, "attribute_schema"):
+        return layer.attribute_schema()
+    fields = []
+    for col in layer.columns:
+        if col == layer.geometry.name:
+            continue
+        values = layer[col]
+        if values.dtype == object:
+            type_ = pa.infer_type(values.dropna().to_numpy(), from_pandas=True)
+        else:
+            type_ = pa.Schema.from_pandas(values.iloc[:0].to_frame(), preserve_index=False).field(col).type
+        fields.append(pa.field(col, type_))
+    return pa.schema(fields)
+
+
+class ParquetChunks:
+    """Writes GeoParquet row groups and hands back the bytes written so far."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.buffer = []
+        self.writer = None
+
+    # file-like interface used by the parquet writer
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    @property
+    def closed(self):
+        return False
+
+    def drain(self):
+        data = b"".join(self.buffer)
+        self.buffer = []
+        return data
+
+    def table(self, gdf):
+        geometry_column = gdf.geometry.name
+        table = pa.Table.from_pandas(gdf.drop(columns=geometry_column), preserve_index=False)
+        table = table.append_column(geometry_column, pa.array(shapely.to_wkb(gdf.geometry.to_numpy()),
+                                                              type=pa.binary()))
+        geo = {"version": "1.0.0", "primary_column": geometry_column,
+               "columns": {geometry_column: {"encoding": "WKB", "geometry_types": [],
+                                             "crs": gdf.crs.to_json_dict() if gdf.crs is not None else None}}}
+        return table.replace_schema_metadata({"geo": json.dumps(geo)})
+
+    def chunk(self, gdf, first):
+        table = self.table(gdf)
+        if self.writer is None:
+            # the layer's attribute types with this chunk's geometry column and metadata
+            schema = pa.schema(list(self.schema) + [table.schema.field(gdf.geometry.name)],
+                               metadata=table.schema.metadata)
+            self.writer = pq.ParquetWriter(self, schema)
+        schema = self.writer.schema
+        self.writer.write_table(table.select(schema.names).cast(schema))
+        return self.drain()
+
+    def close(self):
+        self.writer.close()
+        return self.drain()
+
+
+async def stream_rows(layer, positions, fmt, chunk_rows=CHUNK_ROWS):
+    """Rows of a layer at `positions` as a CSV, GeoJSON or GeoParquet file, in pieces.
+
+    Each chunk is decoded from the layer and encoded in a worker thread, so a large
+    export does not stall the other sessions served by the same process.
+    """
+    parquet = ParquetChunks(layer_schema(layer)) if fmt == "GeoParquet" else None
+    write = parquet.chunk if parquet else csv_chunk if fmt == "CSV" else geojson_chunk
+
+    if fmt == "GeoJSON":
+        yield '{"type": "FeatureCollection", "features": [\n'
+    # always write one (possibly empty) chunk so the file has a header / schema
+    for start in range(0, max(len(positions), 1), chunk_rows):
+        rows = positions[start:start + chunk_rows]
+        yield await asyncio.to_thread(lambda: write(layer.take(rows), start == 0))
+    if fmt == "GeoJSON":
+        yield "\n]}\n"
+    if parquet:
+        yield parquet.close()
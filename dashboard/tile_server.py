@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import threading
+
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+from layers import DATA_DIR
+
+# vector tile pyramids written by Code/vector_tiles.py
+TILE_DIR = os.path.join(DATA_DIR, "tiles")
+
+
+def available_tilesets(tile_dir=TILE_DIR):
+    """Layer names with an .mbtiles file in the tile folder."""
+    if not os.path.isdir(tile_dir):
+        return set()
+    return {f[:-len(".mbtiles")] for f in os.listdir(tile_dir) if f.endswith(".mbtiles")}
+
+
+def tile_app(tile_dir=TILE_DIR):
+    """ASGI app serving /{layer}/{z}/{x}/{y}.pbf from the layers' MBTiles files.
+
+    Tiles are stored gzipped and sent as is. Missing tiles (nothing there at that
+    zoom) are empty 204 responses, which the map skips.
+    """
+    tilesets = available_tilesets(tile_dir)
+    # sqlite connections can't be shared between the server's threads
+    local = threading.local()
+
+    def connection(layer):
+        connections = local.__dict__.setdefault("connections", {})
+        if layer not in connections:
+            uri = "file:" + os.path.join(tile_dir, layer + ".mbtiles") + "?mode=ro"
+            connections[layer] = sqlite3.connect(uri, uri=True)
+        return connections[layer]
+
+    def tile(request):
+        layer = request.path_params["layer"]
+        if layer not in tilesets:
+            return Response(status_code=404)
+        z, x, y = (request.path_params[k] for k in ("z", "x", "y"))
+        row = connection(layer).execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, 2 ** z - 1 - y)).fetchone()
+        if row is None:
+            return Response(status_code=204)
+        return Response(row[0], media_type="application/x-protobuf",
+                        headers={"Content-Encoding": "gzip", "Cache-Control": "public, max-age=86400"})
+
+    return Starlette(routes=[Route("/{layer}/{z:int}/{x:int}/{y:int}.pbf", tile)])
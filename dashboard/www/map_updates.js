@@ -0,0 +1,38 @@
+// Forwards map layer updates from the server to the folium map inside an output's
+// iframe, so toggling layers or zoning categories doesn't rebuild the map.
+(function() {
+  var latest = {};
+
+  function frameOf(outputId) {
+    var frame = document.querySelector("#" + outputId + " iframe");
+    return frame && frame.contentWindow ? frame : null;
+  }
+
+  function send(outputId) {
+    var frame = frameOf(outputId);
+    if (frame) {
+      frame.contentWindow.postMessage({kihc: latest[outputId]}, "*");
+    }
+  }
+
+  // maps announce themselves once loaded, re-send the latest state in case it
+  // changed while the map was being rendered
+  window.addEventListener("message", function(event) {
+    if (!event.data || !event.data.kihcReady) {
+      return;
+    }
+    Object.keys(latest).forEach(function(outputId) {
+      var frame = frameOf(outputId);
+      if (frame && frame.contentWindow === event.source) {
+        send(outputId);
+      }
+    });
+  });
+
+  $(function() {
+    Shiny.addCustomMessageHandler("kihc_map_update", function(message) {
+      latest[message.output] = message;
+      send(message.output);
+    });
+  });
+})();